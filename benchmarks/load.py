@@ -0,0 +1,143 @@
+"""
+Load test for server mode (sparql_core.server) against the stub model server.
+
+    python -m benchmarks.load                          # 1, 2, 4, 8, 16 concurrent sessions
+    python -m benchmarks.load --sessions 1 4 16 --slots 4 --turns 10
+
+Every simulated client opens its own session and sends --turns messages over
+streamed HTTP (server-sent events), one after the other. The stub model server
+runs --slots completions at once (like OLLAMA_NUM_PARALLEL) and the brain is
+allowed the same number of concurrent requests, so throughput should grow with
+the number of sessions until the slots are full, and then queueing shows up in
+the latency instead.
+"""
+import argparse
+import asyncio
+import contextlib
+import http.client
+import io
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .run import temporary_workdir
+from .stubs import StubChatServer
+
+# Messages the fast-path router doesn't answer, so every turn reaches the model
+LOAD_MESSAGES = [
+    "tell me something interesting",
+    "how are you doing today",
+    "give me an idea for dinner",
+    "explain how rainbows form",
+]
+
+
+def _post(port: int, path: str, payload: dict) -> dict:
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+    connection.request("POST", path, json.dumps(payload), {"Content-Type": "application/json"})
+    response = connection.getresponse()
+    data = json.loads(response.read())
+    connection.close()
+    return data
+
+
+def _streamed_turn(port: int, session_id: str, message: str):
+    """Sends one streamed chat turn. Returns (seconds to the first sentence, seconds to the end)."""
+    started_at = time.perf_counter()
+    first_sentence_at = None
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+    connection.request(
+        "POST", f"/sessions/{session_id}/chat", json.dumps({"message": message, "stream": True}),
+        {"Content-Type": "application/json"},
+    )
+    response = connection.getresponse()
+    event = None
+    for line in response:
+        line = line.decode().strip()
+        if line.startswith("event:"):
+            event = line.split(":", 1)[1].strip()
+        elif line.startswith("data:") and event == "sentence" and first_sentence_at is None:
+            first_sentence_at = time.perf_counter()
+        elif line.startswith("data:") and event in ("done", "error"):
+            break
+    connection.close()
+    finished_at = time.perf_counter()
+    return (first_sentence_at or finished_at) - started_at, finished_at - started_at
+
+
+def _client(port: int, client_id: int, turns: int) -> list:
+    # Anonymous sessions: each gets a memory namespace of its own, no user token needed
+    session_id = _post(port, "/sessions", {})["session_id"]
+    return [_streamed_turn(port, session_id, LOAD_MESSAGES[(client_id + i) % len(LOAD_MESSAGES)]) for i in range(turns)]
+
+
+def _percentile(values: list, pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(pct / 100 * len(values)) - 1))]
+
+
+def bench_load(session_counts=(1, 2, 4, 8, 16), turns: int = 5, slots: int = 4,
+               prefill_seconds: float = 0.05, seconds_per_token: float = 0.003) -> tuple:
+    with temporary_workdir():
+        from sparql_core.core_brain import CoreBrain
+        from sparql_core.server import SparqlServer
+
+        results = []
+        # The brain prints a [Latency] line per completion; keep them out of the report
+        with contextlib.redirect_stdout(io.StringIO()), StubChatServer(
+            prefill_seconds=prefill_seconds, seconds_per_token=seconds_per_token, parallel=slots
+        ) as stub:
+            brain = CoreBrain(base_url=stub.base_url, max_concurrent_requests=slots)
+            brain.client  # Import openai before timing starts
+            server = SparqlServer(brain)
+            threading.Thread(target=asyncio.run, args=(server.serve(port=0),), daemon=True).start()
+            server.ready.wait()
+
+            for sessions in session_counts:
+                started_at = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=sessions) as pool:
+                    timings = [t for client in pool.map(lambda i: _client(server.port, i, turns), range(sessions)) for t in client]
+                wall_seconds = time.perf_counter() - started_at
+                first_sentence = [first for first, _ in timings]
+                total = [seconds for _, seconds in timings]
+                results.append({
+                    "sessions": sessions,
+                    "turns": len(timings),
+                    "turns_per_second": len(timings) / wall_seconds,
+                    "first_sentence_p50_ms": _percentile(first_sentence, 50) * 1000,
+                    "turn_p50_ms": _percentile(total, 50) * 1000,
+                    "turn_p95_ms": _percentile(total, 95) * 1000,
+                })
+            stats = server.stats()
+        return results, stats
+
+
+def print_load(results: list, stats: dict, slots: int):
+    print(f"\n=== Server load test ({slots} model slots) ===")
+    columns = ["sessions", "turns", "turns_per_second", "first_sentence_p50_ms", "turn_p50_ms", "turn_p95_ms"]
+    print("".join(f"{column:>24}" for column in columns))
+    for row in results:
+        print("".join(f"{row[column]:>24.1f}" if isinstance(row[column], float) else f"{row[column]:>24}" for column in columns))
+    print(f"server stats: sessions {stats['sessions']}, turns {stats['turns']}, rejected {stats['rejected']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test SPARQL.AI's server mode against a stub model server")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="concurrent sessions per run")
+    parser.add_argument("--turns", type=int, default=5, help="turns per session")
+    parser.add_argument("--slots", type=int, default=4, help="completions the stub (and the brain) run at once")
+    parser.add_argument("--prefill", type=float, default=0.05, help="stub server prefill latency (s)")
+    parser.add_argument("--per-token", type=float, default=0.003, help="stub server decode latency per token (s)")
+    parser.add_argument("--json", metavar="FILE", help="also write the results as JSON")
+    args = parser.parse_args()
+
+    results, stats = bench_load(args.sessions, args.turns, args.slots, args.prefill, args.per_token)
+    print_load(results, stats, args.slots)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"load": results, "server": stats}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""
+Offline performance benchmarks for SPARQL.AI.
+
+    python -m benchmarks.run                      # both benchmarks, default sizes
+    python -m benchmarks.run session --turns 500  # long voice session
+    python -m benchmarks.run memory --sizes 10 1000 100000
+    python -m benchmarks.run --json results.json  # also save the numbers
+
+The session benchmark drives the real run_sparql_ai() / CoreBrain / call_tool /
+MemoryManager code against StubChatServer, InMemorySearch and the fake
+microphone and speaker, so no Ollama, audio devices or network are needed.
+Everything runs inside a temporary working directory, so the real memory and
+search cache files are never touched.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from .stubs import InMemorySearch, StubChatServer
+
+SESSION_UTTERANCES = [
+    "what time is it",
+    "remember that my favorite color is blue",
+    "what's the weather in Delhi today",
+    "tell me something interesting",
+    "what is my favorite color",
+    "search for the latest tech news",
+    "how are you doing",
+]
+
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process (peak RSS where /proc isn't available)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+@contextlib.contextmanager
+def temporary_workdir():
+    previous = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="sparql-bench-") as workdir:
+        os.chdir(workdir)
+        try:
+            yield workdir
+        finally:
+            os.chdir(previous)
+
+
+# --- SESSION BENCHMARK ---
+
+def bench_session(turns: int = 200, prefill_seconds: float = 0.02, seconds_per_token: float = 0.001,
+                  search_latency: float = 0.05, use_tracemalloc: bool = True, fast_path: bool = True) -> dict:
+    """Runs one long run_sparql_ai() session and reports latency, throughput and memory growth."""
+    with temporary_workdir() as workdir:
+        # Imported here so every relative file (memory, search cache) lands in workdir
+        from sparql_core import tools
+        from sparql_core.core_brain import CoreBrain
+        from sparql_core.fake_audio import FakeMicrophone, FakeSpeaker, FakeVoice
+        from sparql_core.main import run_sparql_ai
+        from sparql_core.tracing import summarize, tracer
+
+        class SamplingMicrophone(FakeMicrophone):
+            """Takes a memory sample at the start of every turn."""
+
+            def __init__(self, script, **kwargs):
+                super().__init__(script, **kwargs)
+                self.samples = []
+
+            def listen_for_command(self):
+                traced = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+                self.samples.append((current_rss_bytes(), traced))
+                return super().listen_for_command()
+
+        script = [SESSION_UTTERANCES[i % len(SESSION_UTTERANCES)] for i in range(turns)] + ["exit"]
+        microphone = SamplingMicrophone(script, words_per_second=10_000)
+        speaker = FakeSpeaker(words_per_second=10_000)
+        tools.search_backend = InMemorySearch(latency_seconds=search_latency)
+        trace_file = os.path.join(workdir, "trace.jsonl")
+        tracer.configure(trace_file)
+
+        with StubChatServer(prefill_seconds=prefill_seconds, seconds_per_token=seconds_per_token) as stub:
+            brain = CoreBrain(base_url=stub.base_url, fast_path=fast_path)
+            # What warm_up() does in the background, done up front so no turn pays for it
+            brain.client
+            brain.memory.preload()
+            if use_tracemalloc:
+                tracemalloc.start()
+            started_at = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                run_sparql_ai(brain=brain, voice=FakeVoice(microphone, speaker))
+            wall_seconds = time.perf_counter() - started_at
+            peak_traced = tracemalloc.get_traced_memory()[1] if use_tracemalloc else 0
+            if use_tracemalloc:
+                tracemalloc.stop()
+            model_requests = stub.requests
+
+        tracer.configure(None)
+        stages = summarize(trace_file)
+        search_stats = tools.search_cache.stats()
+
+    samples = microphone.samples
+    warm = samples[min(len(samples) - 1, max(1, len(samples) // 10)):]  # skip start-up allocations
+    rss_growth = warm[-1][0] - warm[0][0]
+    traced_growth = warm[-1][1] - warm[0][1]
+    per_100 = 100 / max(1, len(warm) - 1)
+    return {
+        "turns": turns,
+        "wall_seconds": wall_seconds,
+        "turns_per_second": turns / wall_seconds,
+        "model_requests": model_requests,
+        "stages": stages,
+        "rss_start_mb": samples[0][0] / 2**20,
+        "rss_end_mb": samples[-1][0] / 2**20,
+        "rss_growth_mb_per_100_turns": rss_growth * per_100 / 2**20,
+        "traced_growth_kb_per_100_turns": traced_growth * per_100 / 2**10 if use_tracemalloc else None,
+        "traced_peak_mb": peak_traced / 2**20 if use_tracemalloc else None,
+        "search_cache": search_stats,
+        "router": brain.router.stats(),
+    }
+
+
+def print_session(result: dict):
+    print(f"\n=== Session: {result['turns']} turns against the stub server ===")
+    print(f"wall time        {result['wall_seconds']:.2f}s   throughput {result['turns_per_second']:.1f} turns/s"
+          f"   model requests {result['model_requests']}")
+    print(f"{'stage':<28}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, stats in sorted(result["stages"].items(), key=lambda item: -item[1]["p50"]):
+        print(f"{stage:<28}{stats['count']:>7}{stats['p50'] * 1000:>10.1f}"
+              f"{stats['p95'] * 1000:>10.1f}{stats['p99'] * 1000:>10.1f}")
+    print(f"RSS              {result['rss_start_mb']:.1f} MB -> {result['rss_end_mb']:.1f} MB"
+          f"   growth {result['rss_growth_mb_per_100_turns']:.2f} MB / 100 turns")
+    if result["traced_growth_kb_per_100_turns"] is not None:
+        print(f"Python heap      growth {result['traced_growth_kb_per_100_turns']:.1f} KB / 100 turns"
+              f"   peak {result['traced_peak_mb']:.1f} MB (tracemalloc)")
+    print(f"search cache     {result['search_cache']}")
+    router = result["router"]
+    print(f"fast path        {router['routed']}/{router['total']} turns routed ({router['hit_rate']:.0%}) {router['by_intent']}"
+          f"   {router['completions_skipped']} completions skipped, ~{router['seconds_saved']:.1f}s saved")
+
+
+# --- MEMORY STORE SCALING ---
+
+def bench_memory(sizes=(10, 100, 1_000, 10_000, 100_000), queries: int = 200) -> list:
+    """Measures MemoryManager costs as the number of stored facts grows."""
+    from sparql_core.memory import MemoryManager
+
+    topics = ["food", "color", "city", "music", "sport", "movie", "book", "car", "pet", "job"]
+    results = []
+    rng = random.Random(42)
+    for size in sizes:
+        with temporary_workdir():
+            memory = MemoryManager("bench_memory.json")
+            started_at = time.perf_counter()
+            for i in range(size):
+                topic = topics[i % len(topics)]
+                memory.save(f"{topic}_fact_{i}", f"The user's {topic} preference number {i} is item{rng.randrange(size)}")
+            insert_seconds = time.perf_counter() - started_at
+
+            # A second manager pays the full cost of loading the cache and building the index
+            started_at = time.perf_counter()
+            cold = MemoryManager("bench_memory.json")
+            cold.load("food_fact_0")
+            cold_load_seconds = time.perf_counter() - started_at
+
+            def per_call(function, *args):
+                started = time.perf_counter()
+                for _ in range(queries):
+                    function(*args)
+                return (time.perf_counter() - started) / queries
+
+            results.append({
+                "facts": size,
+                "insert_us_per_fact": insert_seconds / size * 1e6,
+                "cold_load_ms": cold_load_seconds * 1000,
+                "load_us": per_call(memory.load, f"music_fact_{size // 2}") * 1e6,
+                "relevant_prompt_us": per_call(memory.get_relevant_memory_as_string, "what is my favourite music") * 1e6,
+                "fuzzy_key_us": per_call(memory.find_key, "favourite sport") * 1e6,
+                "save_us": per_call(memory.save, "bench_key", "bench value") * 1e6,
+                "db_kb": os.path.getsize(memory.db_file) / 1024,
+            })
+    return results
+
+
+def print_memory(results: list):
+    print("\n=== Memory store scaling ===")
+    columns = ["facts", "insert_us_per_fact", "cold_load_ms", "load_us", "relevant_prompt_us", "fuzzy_key_us", "save_us", "db_kb"]
+    print("".join(f"{column:>20}" for column in columns))
+    for row in results:
+        print("".join(f"{row[column]:>20.1f}" if isinstance(row[column], float) else f"{row[column]:>20}" for column in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline SPARQL.AI benchmarks")
+    parser.add_argument("benchmark", nargs="?", choices=["all", "session", "memory"], default="all")
+    parser.add_argument("--turns", type=int, default=200, help="turns in the session benchmark")
+    parser.add_argument("--prefill", type=float, default=0.02, help="stub server prefill latency (s)")
+    parser.add_argument("--per-token", type=float, default=0.001, help="stub server decode latency per token (s)")
+    parser.add_argument("--search-latency", type=float, default=0.05, help="in-memory search latency (s)")
+    parser.add_argument("--no-fast-path", action="store_true", help="send every turn to the model (for A/B runs)")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="skip heap tracking (it slows the session down)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1_000, 10_000, 100_000])
+    parser.add_argument("--json", metavar="FILE", help="also write the results as JSON")
+    args = parser.parse_args()
+
+    results = {}
+    if args.benchmark in ("all", "session"):
+        results["session"] = bench_session(
+            turns=args.turns, prefill_seconds=args.prefill, seconds_per_token=args.per_token,
+            search_latency=args.search_latency, use_tracemalloc=not args.no_tracemalloc, fast_path=not args.no_fast_path,
+        )
+        print_session(results["session"])
+    if args.benchmark in ("all", "memory"):
+        results["memory"] = bench_memory(sizes=args.sizes)
+        print_memory(results["memory"])
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Offline stand-ins for SPARQL.AI's network dependencies:
+
+- StubChatServer: a local OpenAI-compatible /v1/chat/completions endpoint
+  (plus Ollama's /api/generate for warm-up) with scripted tool calls and
+  configurable prefill/decode latency.
+- InMemorySearch: a search backend for tools.search_backend.
+"""
+import contextlib
+import itertools
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# (pattern on the latest user message, tool name, function building the arguments)
+DEFAULT_TOOL_SCRIPT = [
+    (r"\btime\b", "get_current_time", lambda text: {}),
+    (r"\bremember\b", "save_to_memory", lambda text: {"key": "note_" + "_".join(text.split()[-2:]), "value": text}),
+    (r"\b(weather|news|search|latest)\b", "google_search", lambda text: {"query": text}),
+    (r"\bwhat is my\b", "load_from_memory", lambda text: {"key": text.split("what is my", 1)[1].strip(" ?")}),
+]
+
+FILLER_WORDS = (
+    "Sure, here is what I found. It looks like everything is in order and there is nothing "
+    "else you need to do right now. Let me know if you want more detail."
+).split()
+
+
+def _estimate_tokens(request: dict) -> int:
+    """Prompt size: the messages plus the tool schemas, which the model prefills too."""
+    characters = sum(len(json.dumps(message)) for message in request["messages"])
+    return (characters + len(json.dumps(request.get("tools") or []))) // 4
+
+
+class StubChatServer:
+    """
+    Scripted OpenAI-compatible chat server on localhost.
+
+    The latest user message is matched against tool_script: a match on a tool
+    the request offers makes the first completion return that tool call; the
+    completion after the tool results (or a message with no match) returns
+    reply_words words of text.
+    Latency is prefill_seconds + prefill_seconds_per_1k_tokens per 1k prompt
+    tokens before the first token, then seconds_per_token for every word.
+    With parallel=N only N completions run at once and the rest queue, like
+    Ollama with OLLAMA_NUM_PARALLEL=N.
+    """
+
+    def __init__(self, prefill_seconds: float = 0.05, prefill_seconds_per_1k_tokens: float = 0.02,
+                 seconds_per_token: float = 0.002, reply_words: int = 30, tool_script=None, port: int = 0,
+                 parallel: int = None):
+        self.prefill_seconds = prefill_seconds
+        self.prefill_seconds_per_1k_tokens = prefill_seconds_per_1k_tokens
+        self.seconds_per_token = seconds_per_token
+        self.reply_words = reply_words
+        self.tool_script = [(re.compile(p, re.I), name, args) for p, name, args in (tool_script or DEFAULT_TOOL_SCRIPT)]
+        self.requests = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(parallel) if parallel else None
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # --- SCRIPTED BEHAVIOUR ---
+
+    def plan_reply(self, request: dict):
+        """Returns ("tool", name, arguments) or ("text", words)."""
+        messages = request["messages"]
+        offered = {tool["function"]["name"] for tool in request.get("tools") or []}
+        if offered and messages[-1]["role"] == "user":
+            for pattern, name, build_args in self.tool_script:
+                if name in offered and pattern.search(messages[-1]["content"] or ""):
+                    return "tool", name, build_args(messages[-1]["content"])
+        if messages[-1]["role"] == "tool":
+            words = f"Done. {messages[-1]['content']}".split()[:8] + FILLER_WORDS
+        else:
+            words = FILLER_WORDS
+        return "text", (words * (self.reply_words // len(words) + 1))[:self.reply_words]
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with stub._lock:
+                    stub.requests += 1
+                if self.path.endswith("/api/generate"):
+                    self._send_json({"model": request.get("model"), "done": True, "load_duration": 0})
+                elif self.path.endswith("/chat/completions"):
+                    with stub._slots or contextlib.nullcontext():
+                        stub._complete(self, request)
+                else:
+                    self.send_error(404)
+
+            def _send_json(self, payload: dict):
+                body = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def _complete(self, handler, request: dict):
+        prompt_tokens = _estimate_tokens(request)
+        time.sleep(self.prefill_seconds + self.prefill_seconds_per_1k_tokens * prompt_tokens / 1000)
+
+        completion_id = f"chatcmpl-stub-{next(self._ids)}"
+        plan = self.plan_reply(request)
+        usage = {"prompt_tokens": prompt_tokens}
+
+        if plan[0] == "tool":
+            _, name, arguments = plan
+            tool_call = {"id": f"call_{completion_id}", "type": "function",
+                         "function": {"name": name, "arguments": json.dumps(arguments)}}
+            usage["completion_tokens"] = 10
+            message = {"role": "assistant", "content": None, "tool_calls": [tool_call]}
+            deltas = [{"role": "assistant", "tool_calls": [{"index": 0, **tool_call}]}]
+            finish_reason = "tool_calls"
+        else:
+            words = plan[1]
+            usage["completion_tokens"] = len(words)
+            message = {"role": "assistant", "content": " ".join(words)}
+            deltas = [{"content": word + " "} for word in words]
+            finish_reason = "stop"
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        if not request.get("stream"):
+            time.sleep(self.seconds_per_token * usage["completion_tokens"])
+            handler._send_json({
+                "id": completion_id, "object": "chat.completion", "created": int(time.time()),
+                "model": request.get("model"),
+                "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                "usage": usage,
+            })
+            return
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Transfer-Encoding", "chunked")
+        handler.end_headers()
+
+        def send_event(data: str):
+            payload = f"data: {data}\n\n".encode()
+            handler.wfile.write(f"{len(payload):x}\r\n".encode() + payload + b"\r\n")
+            handler.wfile.flush()
+
+        def chunk(choices, extra=None):
+            return json.dumps({
+                "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": request.get("model"), "choices": choices, **(extra or {}),
+            })
+
+        try:
+            for delta in deltas:
+                send_event(chunk([{"index": 0, "delta": delta, "finish_reason": None}]))
+                time.sleep(self.seconds_per_token)
+            send_event(chunk([{"index": 0, "delta": {}, "finish_reason": finish_reason}]))
+            if (request.get("stream_options") or {}).get("include_usage"):
+                send_event(chunk([], {"usage": usage}))
+            send_event("[DONE]")
+            handler.wfile.write(b"0\r\n\r\n")
+            handler.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client closed the stream (e.g. barge-in)
+
+
+class InMemorySearch:
+    """Offline search backend: formatted like _search_google's output, with optional latency."""
+
+    def __init__(self, latency_seconds: float = 0.05):
+        self.latency_seconds = latency_seconds
+        self.queries = []
+
+    def __call__(self, query: str) -> str:
+        self.queries.append(query)
+        time.sleep(self.latency_seconds)
+        return "\n".join(
+            f"Title: Result {i} for {query}\nDescription: Offline result {i} about {query}.\nURL: https://example.com/{i}\n"
+            for i in range(1, 4)
+        )
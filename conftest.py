@@ -0,0 +1,2 @@
+# Makes the repository root importable, so `pytest` finds sparql_core and
+# benchmarks the same way `python -m pytest` does.
@@ -0,0 +1,260 @@
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .core_brain import OLLAMA_BASE_URL, CoreBrain
+from .memory import use_memory_file
+from .tools import set_tool_workers
+from .tracing import DEFAULT_TRACE_FILE, tracer
+
+BATCH_MEMORY_DIR = "batch_memory"  # One long-term memory file per replayed session
+PROGRESS_EVERY = 50                # Print progress every this many turns
+
+# Accepted field names in the input JSONL, in order of preference
+TEXT_FIELDS = ("utterance", "text", "message", "body")
+ID_FIELDS = ("id", "request_id")
+SESSION_FIELDS = ("session_id", "session")
+
+
+def _first_field(record: dict, fields: tuple):
+    return next((record[field] for field in fields if record.get(field) not in (None, "")), None)
+
+
+def read_utterances(input_file: str) -> list:
+    """
+    Reads one utterance per JSONL line: {"utterance"/"text"/"message"/"body": ...}
+    with optional "id"/"request_id" and "session_id"/"session". Lines without a
+    session are independent one-turn sessions; lines without an id are named
+    after their line number.
+    """
+    utterances = []
+    with open(input_file, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            text = _first_field(record, TEXT_FIELDS)
+            if text is None:
+                print(f"[Batch] Skipping line {line_number}: no {'/'.join(TEXT_FIELDS)} field")
+                continue
+            utterance_id = str(_first_field(record, ID_FIELDS) or f"line-{line_number}")
+            session_id = str(_first_field(record, SESSION_FIELDS) or utterance_id)
+            utterances.append({"id": utterance_id, "session_id": session_id, "text": str(text)})
+    return utterances
+
+
+def read_finished(output_file: str) -> dict:
+    """
+    {utterance id: output record} for the turns an earlier (interrupted) run already
+    finished. Turns that failed are left out, so they run again.
+    """
+    finished = {}
+    if not os.path.exists(output_file):
+        return finished
+    with open(output_file, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # A line cut short when the run was killed
+            if "error" in record:
+                finished.pop(record["id"], None)
+            else:
+                finished[record["id"]] = record
+    return finished
+
+
+def _memory_file_name(session_id: str) -> str:
+    """A safe, unique file name for a session id."""
+    safe = re.sub(r"[^A-Za-z0-9_-]", "_", session_id)[:48]
+    if safe != session_id:
+        safe += "-" + hashlib.sha1(session_id.encode()).hexdigest()[:8]
+    return f"{safe}.json"
+
+
+class BatchRunner:
+    """
+    Replays recorded utterances through CoreBrain.chat without audio.
+
+    Sessions run concurrently on up to `concurrency` threads; the turns of one
+    session run in input order, with their own conversation history and (unless
+    memory_dir is None) their own long-term memory in memory_dir. One JSON line
+    per turn is appended to output_file as soon as the turn finishes: the reply,
+    the tool calls and their results, and the timings of every stage.
+
+    Rerunning with the same files resumes: turns already in output_file are
+    skipped, and each session's history is rebuilt from its finished turns
+    (user and assistant messages only; tool messages aren't replayed).
+    Turns that failed are run again.
+    """
+
+    def __init__(self, brain: CoreBrain, output_file: str, concurrency: int = 4, memory_dir: str = BATCH_MEMORY_DIR):
+        self.brain = brain
+        self.output_file = output_file
+        self.concurrency = concurrency
+        self.memory_dir = memory_dir
+        self.done = 0
+        self.errors = 0
+        self._total = 0
+        self._started_at = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        set_tool_workers(concurrency)  # Every session may be running tools at the same time
+
+    def run(self, utterances: list) -> dict:
+        finished = read_finished(self.output_file)
+        sessions = {}
+        for utterance in utterances:
+            sessions.setdefault(utterance["session_id"], []).append(utterance)
+        self._total = sum(1 for utterance in utterances if utterance["id"] not in finished)
+        if finished:
+            print(f"[Batch] Resuming: {len(utterances) - self._total} turns already in {self.output_file}")
+        if self.memory_dir:
+            os.makedirs(self.memory_dir, exist_ok=True)
+
+        self._started_at = time.perf_counter()
+        with open(self.output_file, "a", encoding="utf-8") as output:
+            self._output = output
+            if output.tell() and not _ends_with_newline(self.output_file):
+                output.write("\n")  # Don't append to a line cut short by the interruption
+            executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="sparql-batch")
+            futures = [
+                executor.submit(self._run_session, session_id, turns, finished)
+                for session_id, turns in sessions.items()
+                if any(turn["id"] not in finished for turn in turns)
+            ]
+            try:
+                for future in as_completed(futures):
+                    future.result()
+            except KeyboardInterrupt:
+                self._stop.set()
+                print("\n[Batch] Interrupted: finishing the turns in progress. Run again to resume.")
+            finally:
+                executor.shutdown(wait=True, cancel_futures=True)
+        return self.summary()
+
+    def _run_session(self, session_id: str, turns: list, finished: dict):
+        memory_file = os.path.join(self.memory_dir, _memory_file_name(session_id)) if self.memory_dir else None
+        conversation_history = []
+        for turn_number, utterance in enumerate(turns, 1):
+            if self._stop.is_set():
+                return
+            if utterance["id"] in finished:
+                record = finished[utterance["id"]]
+                conversation_history.append({"role": "user", "content": record["input"]})
+                conversation_history.append({"role": "assistant", "content": record["reply"]})
+                continue
+            record = self._run_turn(session_id, turn_number, utterance, conversation_history, memory_file)
+            self._write(record)
+
+    def _run_turn(self, session_id: str, turn_number: int, utterance: dict, conversation_history: list, memory_file) -> dict:
+        record = {"id": utterance["id"], "session_id": session_id, "turn": turn_number, "input": utterance["text"]}
+        memory = use_memory_file(memory_file) if memory_file else contextlib.nullcontext()
+        with memory, tracer.turn(mode="batch", session=session_id) as turn:
+            try:
+                record["reply"] = self.brain.chat(utterance["text"], conversation_history)
+            except Exception as e:
+                print(f"\n[ERROR] {utterance['id']}: {e}")
+                record["reply"] = None
+                record["error"] = str(e)
+                conversation_history.clear()
+
+        record["tool_calls"] = _tool_calls_of_last_turn(conversation_history) if "error" not in record else []
+        trace = turn.record
+        record["routed"] = trace.get("routed")
+        record["seconds"] = trace["seconds"]
+        record["prompt_tokens"] = trace["prompt_tokens"]
+        record["completion_tokens"] = trace["completion_tokens"]
+        record["stages"] = trace["stages"]
+        return record
+
+    def _write(self, record: dict):
+        with self._lock:
+            self._output.write(json.dumps(record, default=str) + "\n")
+            self._output.flush()
+            self.done += 1
+            self.errors += "error" in record
+            if self.done % PROGRESS_EVERY == 0 or self.done == self._total:
+                elapsed = time.perf_counter() - self._started_at
+                print(f"[Batch] {self.done}/{self._total} turns, {self.done / elapsed:.1f} turns/s, {self.errors} errors")
+
+    def summary(self) -> dict:
+        elapsed = time.perf_counter() - self._started_at
+        return {
+            "turns": self.done,
+            "remaining": self._total - self.done,
+            "errors": self.errors,
+            "seconds": elapsed,
+            "turns_per_second": self.done / elapsed if elapsed else 0.0,
+        }
+
+
+def _ends_with_newline(path: str) -> bool:
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def _tool_calls_of_last_turn(conversation_history: list) -> list:
+    """The tool calls (with results) made since the last user message in the history."""
+    turn_start = max((i for i, message in enumerate(conversation_history) if message["role"] == "user"), default=0)
+    results = {
+        message["tool_call_id"]: message["content"]
+        for message in conversation_history[turn_start:] if message["role"] == "tool"
+    }
+    return [
+        {
+            "name": tool_call["function"]["name"],
+            "arguments": tool_call["function"]["arguments"],
+            "result": results.get(tool_call["id"]),
+        }
+        for message in conversation_history[turn_start:]
+        for tool_call in message.get("tool_calls") or []
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded utterances (JSONL) through SPARQL.AI without audio")
+    parser.add_argument("input_file", help="JSONL with one utterance per line (see read_utterances)")
+    parser.add_argument("output_file", help="JSONL to append one result per turn to; rerun to resume")
+    parser.add_argument("--concurrency", type=int, default=4, help="sessions processed at the same time")
+    parser.add_argument("--max-concurrent", type=int, help="requests sent to the model server at once (default: --concurrency)")
+    parser.add_argument("--base-url", default=OLLAMA_BASE_URL, help="OpenAI-compatible model server")
+    parser.add_argument("--memory-dir", default=BATCH_MEMORY_DIR, help="where each session's long-term memory is kept")
+    parser.add_argument("--shared-memory", action="store_true", help="use the normal long-term memory for every session")
+    parser.add_argument("--no-fast-path", action="store_true", help="send every utterance to the model")
+    parser.add_argument("--restart", action="store_true", help="discard output_file (and the sessions' memory) instead of resuming")
+    parser.add_argument("--trace", nargs="?", const=DEFAULT_TRACE_FILE, metavar="FILE", help="also write per-turn traces as JSONL")
+    args = parser.parse_args()
+
+    if args.trace:
+        tracer.configure(args.trace)
+    if args.restart:
+        if os.path.exists(args.output_file):
+            os.remove(args.output_file)
+        if not args.shared_memory:
+            shutil.rmtree(args.memory_dir, ignore_errors=True)
+
+    brain = CoreBrain(
+        base_url=args.base_url,
+        fast_path=not args.no_fast_path,
+        max_concurrent_requests=args.max_concurrent or args.concurrency,
+    )
+    brain.warm_up()
+    runner = BatchRunner(
+        brain, args.output_file, concurrency=args.concurrency,
+        memory_dir=None if args.shared_memory else args.memory_dir,
+    )
+    summary = runner.run(read_utterances(args.input_file))
+    print(
+        f"[Batch] Done: {summary['turns']} turns in {summary['seconds']:.1f}s "
+        f"({summary['turns_per_second']:.1f} turns/s), {summary['errors']} errors, {summary['remaining']} remaining"
+    )
+    brain.router.print_stats()
@@ -0,0 +1,124 @@
+import json
+
+SUMMARY_HEADER = "Summary of the earlier conversation:"
+
+
+def count_tokens(message) -> int:
+    """
+    Roughly counts the tokens in one chat message.
+    Uses the ~4 characters per token rule of thumb, which is close enough for
+    Llama-style tokenizers and doesn't need a tokenizer library.
+    """
+    text = message.get("content") or ""
+    for tool_call in message.get("tool_calls") or []:
+        text += tool_call["function"]["name"] + tool_call["function"]["arguments"]
+    # +4 for the role and the chat template's separator tokens
+    return len(text) // 4 + 4
+
+
+def _shorten(text: str, max_chars: int) -> str:
+    text = " ".join((text or "").split())
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rstrip() + "..."
+
+
+class ContextWindow:
+    """
+    Keeps conversation_history inside a token budget.
+
+    When the history grows past max_tokens it is trimmed in place, cheapest loss first:
+      1. tool outputs in older turns are cut down to a short stub,
+      2. the oldest turns are folded into a running summary message.
+    The last keep_recent_turns turns (at least the current one) are never touched.
+
+    Trimming always goes down to low_water (a fraction of the budget), not just
+    under the limit. That way the history is rewritten once every few turns and
+    in between the prompt prefix (system prompt + summary + older turns) stays
+    byte-for-byte the same, so the model server can reuse its prompt cache.
+    """
+
+    def __init__(self, max_tokens: int = 3000, keep_recent_turns: int = 3,
+                 tool_output_chars: int = 200, summary_tokens: int = 400, low_water: float = 0.6):
+        self.max_tokens = max_tokens
+        self.keep_recent_turns = keep_recent_turns
+        self.tool_output_chars = tool_output_chars
+        self.summary_tokens = summary_tokens
+        self.low_water = low_water
+
+    def history_tokens(self, conversation_history: list) -> int:
+        return sum(count_tokens(message) for message in conversation_history)
+
+    def fit(self, conversation_history: list, system_prompt: str = ""):
+        """Trims conversation_history in place if it (plus the system prompt) is over budget."""
+        system_tokens = len(system_prompt) // 4
+        if system_tokens + self.history_tokens(conversation_history) <= self.max_tokens:
+            return
+
+        target = int(self.max_tokens * self.low_water) - system_tokens
+        summary, turns = self._split_turns(conversation_history)
+        # The current turn is always kept, whatever keep_recent_turns says
+        keep = max(self.keep_recent_turns, 1)
+        old_turns = turns[:-keep]
+        recent_turns = turns[len(old_turns):]
+
+        # 1. Compress tool outputs in older turns
+        for turn in old_turns:
+            for message in turn:
+                if message["role"] == "tool":
+                    message["content"] = _shorten(message["content"], self.tool_output_chars)
+
+        # 2. Fold the oldest turns into the summary until we are under the target
+        summary_lines = summary.splitlines()[1:] if summary else []
+
+        def total():
+            rolled = [{"role": "system", "content": "\n".join([SUMMARY_HEADER] + summary_lines)}] if summary_lines else []
+            return self.history_tokens(rolled + [m for turn in old_turns + recent_turns for m in turn])
+
+        while old_turns and total() > target:
+            summary_lines.append(self._summarize_turn(old_turns.pop(0)))
+            # Keep the summary itself bounded: forget the oldest summary lines first
+            while len(summary_lines) > 1 and sum(len(line) for line in summary_lines) // 4 > self.summary_tokens:
+                summary_lines.pop(0)
+
+        conversation_history[:] = [m for turn in old_turns + recent_turns for m in turn]
+        if summary_lines:
+            conversation_history.insert(0, {"role": "system", "content": "\n".join([SUMMARY_HEADER] + summary_lines)})
+
+    def _split_turns(self, conversation_history: list):
+        """Splits the history into (summary_text, turns). A turn starts at each user message."""
+        summary = ""
+        turns = []
+        for message in conversation_history:
+            if message["role"] == "system" and message["content"].startswith(SUMMARY_HEADER):
+                summary = message["content"]
+            elif message["role"] == "user" or not turns:
+                turns.append([message])
+            else:
+                turns[-1].append(message)
+        return summary, turns
+
+    def _summarize_turn(self, turn: list) -> str:
+        """One line per turn: what the user asked, which tools ran and what was answered."""
+        user_text = ""
+        tools_used = []
+        answer = ""
+        for message in turn:
+            if message["role"] == "user":
+                user_text = message["content"]
+            elif message.get("tool_calls"):
+                for tool_call in message["tool_calls"]:
+                    try:
+                        args = json.loads(tool_call["function"]["arguments"] or "{}")
+                    except json.JSONDecodeError:
+                        args = {}
+                    tools_used.append(f"{tool_call['function']['name']}({', '.join(map(str, args.values()))})")
+            elif message["role"] == "assistant" and message.get("content"):
+                answer = message["content"]
+
+        line = f"- User: {_shorten(user_text, 120)}"
+        if tools_used:
+            line += f" | Tools: {_shorten('; '.join(tools_used), 80)}"
+        if answer:
+            line += f" | Assistant: {_shorten(answer, 160)}"
+        return line
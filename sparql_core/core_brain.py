@@ -1,7 +1,14 @@
+import json
 import os
-from openai import OpenAI
-from .memory import MemoryManager
-from .tools import TOOL_MANIFEST, call_tool 
+import threading
+import time
+from types import SimpleNamespace
+from .context import ContextWindow
+from .memory import get_memory_manager
+from .router import INTENT_TOOLS, IntentRouter, match_intent, phrase_tool_result
+from .streaming import SentenceChunker, ToolCallAccumulator, tool_calls_to_dicts
+from .tools import call_tools, registry
+from .tracing import tracer
 import sys 
 
 # --- ROBUST, PERMANENT FIX FOR ENVIRONMENT INJECTION ERRORS ---
@@ -14,31 +21,184 @@ ACCEPTED_KWARGS = [
     'default_headers', 'client', 'transport', 'proxies', 'http_proxy', 'https_proxy'
 ]
 
-# 2. Capture all environment variables
-kwargs = {k.lower(): v for k, v in os.environ.items()}
+def get_safe_kwargs() -> dict:
+    """Called when the client is created (not at import), so startup doesn't pay for it."""
+    # 2. Capture all environment variables
+    kwargs = {k.lower(): v for k, v in os.environ.items()}
 
-# 3. Filter environment variables, keeping only ACCEPTED_KWARGS
-safe_kwargs = {k: v for k, v in kwargs.items() if k in ACCEPTED_KWARGS}
+    # 3. Filter environment variables, keeping only ACCEPTED_KWARGS
+    return {k: v for k, v in kwargs.items() if k in ACCEPTED_KWARGS}
+
+# How much long-term memory goes into each request
+MEMORY_TOP_K = 8
+MEMORY_PROMPT_TOKENS = 300
+
+# --- MODEL SERVER SETTINGS ---
+OLLAMA_BASE_URL = 'http://localhost:11434/v1'
+MODEL_NAME = "llama3-groq-tool-use:8b" # Using the correct tool-use model.
+KEEP_ALIVE = "30m"           # How long Ollama keeps the model loaded after our keep-alive pings
+# Completions sent through /v1 don't carry keep_alive, so each one resets Ollama's unload
+# timer to its default of 5 minutes; the ping has to come well before that runs out
+KEEP_ALIVE_PING_SECONDS = 120 # Ping when idle this long
+KEEP_ALIVE_CHECK_SECONDS = 15 # How often the idle time is checked (worst case: ping after 135s)
+KEEP_ALIVE_MAX_FAILURES = 3   # Stop pinging after this many failures in a row (e.g. not an Ollama server)
+MAX_CONCURRENT_REQUESTS = 1  # Requests we send to the model server at the same time
 
 class CoreBrain:
-    def __init__(self):
+    def __init__(self, context_tokens: int = 3000, base_url: str = OLLAMA_BASE_URL, model: str = MODEL_NAME,
+                 fast_path: bool = True, max_concurrent_requests: int = MAX_CONCURRENT_REQUESTS):
+        
+        self.model = model
+        self.base_url = base_url
+        
+        # The OpenAI client is created on first use (see the client property):
+        # importing openai takes longer than everything else at startup put together.
+        self._client = None
+        self.http_client = None
+        self._client_lock = threading.Lock()
+        
+        # Keeps conversation_history (and so prompt-processing time) inside a token budget
+        self.context = ContextWindow(max_tokens=context_tokens)
+        
+        # Per-turn timings (time to first audio, every completion and tool) go into
+        # the current trace record, not onto the brain: one brain serves many
+        # sessions at once in server and batch mode.
+        
+        # Limits how many requests wait on the model server at once; time spent
+        # waiting here is reported as "queue" time.
+        self.max_concurrent_requests = max_concurrent_requests
+        self._model_slots = threading.Semaphore(max_concurrent_requests)
+        self._last_request_at = time.monotonic()
+        self.cold_start_seconds = None
+        
+        # Answers trivial requests (time, remember/recall) without the model, and
+        # skips the phrasing completion when one tool's result can be spoken as-is
+        self.fast_path = fast_path
+        self.router = IntentRouter()
+        self._completion_seconds = None  # Moving average, used to estimate the time the fast path saves
+
+    @property
+    def client(self):
+        """The OpenAI client, created (and openai imported) on first use."""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._create_client()
+        return self._client
+
+    def _create_client(self):
+        import httpx
+        from openai import OpenAI
         
         # Add the necessary Ollama parameters to the safe arguments, overriding any system settings
-        safe_kwargs['base_url'] = 'http://localhost:11434/v1' 
+        safe_kwargs = get_safe_kwargs()
+        safe_kwargs['base_url'] = self.base_url 
         safe_kwargs['api_key'] = 'ollama'
         
+        # One pooled HTTP client for every request to the model server, so each
+        # turn reuses an open connection. The read timeout is long because the
+        # first request may have to wait for the model to load.
+        self.http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=max(8, 2 * self.max_concurrent_requests),
+                max_keepalive_connections=max(4, self.max_concurrent_requests),
+                keepalive_expiry=KEEP_ALIVE_PING_SECONDS + 2 * KEEP_ALIVE_CHECK_SECONDS,
+            ),
+            timeout=httpx.Timeout(connect=3.0, read=120.0, write=10.0, pool=30.0),
+        )
+        
         # Initialize the client using ONLY the safe arguments
         try:
-             self.client = OpenAI(**safe_kwargs)
+            return OpenAI(**safe_kwargs, http_client=self.http_client)
         except Exception as e:
             print(f"\n[FATAL ERROR]: Could not initialize OpenAI client. Underlying error: {e}")
             print("Action: Check if the Ollama service is running and accessible.")
             sys.exit(1)
-        
-        self.memory = MemoryManager()
+
+    @property
+    def memory(self):
+        """Long-term memory for the current context (one per session in server mode, see memory.use_memory_file)."""
+        return get_memory_manager()
+
+    # --- MODEL WARM-UP AND KEEP-ALIVE ---
+
+    def warm_up(self):
+        """
+        In the background: creates the client, loads long-term memory and loads
+        the model, so the first turn doesn't pay for any of it; then keeps the
+        model loaded while the assistant sits idle. Returns immediately.
+        """
+        thread = threading.Thread(target=self._warm_up_and_keep_alive, daemon=True)
+        thread.start()
+        return thread
+
+    def _warm_up_and_keep_alive(self):
+        started_at = time.perf_counter()
+        self.client  # Imports openai and creates the client while the microphone starts up
+        self.memory.preload()
+        print(f"[Startup] Client and memory ready in {time.perf_counter() - started_at:.2f}s")
+        with self._model_slots:
+            load_seconds = self._ping_model()
+        failures = 0
+        if load_seconds is not None:
+            self.cold_start_seconds = time.perf_counter() - started_at
+            print(f"[Startup] Model ready in {self.cold_start_seconds:.2f}s (model load {load_seconds:.2f}s)")
+        else:
+            failures = 1
+
+        while failures < KEEP_ALIVE_MAX_FAILURES:
+            time.sleep(KEEP_ALIVE_CHECK_SECONDS)
+            if time.monotonic() - self._last_request_at >= KEEP_ALIVE_PING_SECONDS:
+                with self._model_slots:
+                    failures = 0 if self._ping_model() is not None else failures + 1
+        print(f"[Warm-up] Keep-alive pings stopped after {failures} failures in a row")
+
+    def _ping_model(self):
+        """
+        Asks Ollama to load the model (an empty prompt generates nothing) and to
+        keep it loaded for KEEP_ALIVE. Returns Ollama's model load time in seconds.
+        """
+        ollama_root = self.base_url.rstrip('/').removesuffix('/v1')
+        self.client  # Creates http_client
+        try:
+            response = self.http_client.post(
+                f"{ollama_root}/api/generate",
+                json={"model": self.model, "keep_alive": KEEP_ALIVE},
+            )
+            response.raise_for_status()
+            self._last_request_at = time.monotonic()
+            # Ollama reports durations in nanoseconds
+            return response.json().get("load_duration", 0) / 1e9
+        except Exception as e:
+            print(f"[Warm-up Error]: Could not pre-load the model: {e}")
+            return None
+
+    def _record_timing(self, queue_seconds: float, prefill_seconds: float, decode_seconds: float, total_seconds: float, usage=None) -> dict:
+        """Prints where the time of one completion went and returns it for the trace span."""
+        timing = {
+            "queue": queue_seconds,
+            "prefill": prefill_seconds,
+            "decode": decode_seconds,
+            "total": total_seconds,
+            "prompt_tokens": usage.prompt_tokens if usage else None,
+            "completion_tokens": usage.completion_tokens if usage else None,
+        }
+        if self._completion_seconds is None:
+            self._completion_seconds = total_seconds
+        else:
+            self._completion_seconds = 0.8 * self._completion_seconds + 0.2 * total_seconds
+        print(
+            f"[Latency] completion: queue {queue_seconds:.2f}s, prefill {prefill_seconds:.2f}s, "
+            f"decode {decode_seconds:.2f}s"
+        )
+        return timing
 
     def get_system_prompt(self) -> str:
-        """Builds the master system prompt with memory."""
+        """
+        Builds the master system prompt.
+        It doesn't change between turns, so the model server can reuse its
+        prompt cache; the memory facts for each turn go in get_memory_prompt().
+        """
         
         # --- PROMPT UPDATED HERE ---
         base_prompt = (
@@ -48,75 +208,95 @@ class CoreBrain:
             "When a user asks to remember something, use the 'save_to_memory' tool."
             "If you are asked for real-time information, news, weather, or facts you don't know, you MUST use the 'google_search' tool."
             "Do not apologize for not having real-time information. Instead, use the 'google_search' tool to find it."
+            "Facts from your long-term memory that look relevant are given just before the user's latest message."
+            "If you need a fact that isn't there, use the 'load_from_memory' tool."
         )
         # --- END OF PROMPT UPDATE ---
-        
-        # This is your "Personalization Layer v1"
-        memory_data = self.memory.get_all_memory_as_string()
-        personalized_prompt = f"""
-        {base_prompt}
+        return base_prompt
 
+    def get_memory_prompt(self, user_input: str) -> str:
+        """
+        This is your "Personalization Layer v2": every stored fact while they fit
+        in a small token budget, then only the ones most relevant to user_input.
+        """
+        memory_data = self.memory.get_relevant_memory_as_string(
+            user_input, k=MEMORY_TOP_K, max_tokens=MEMORY_PROMPT_TOKENS
+        )
+        return f"""
         ---
-        Here is what you know about the user (your long-term memory):
+        Here is what you know about the user that may be relevant (from your long-term memory):
         {memory_data}
         ---
         """
-        return personalized_prompt
 
-    def chat(self, user_input: str, conversation_history: list):
+    def _build_messages(self, system_prompt: str, memory_prompt: str, conversation_history: list) -> list:
+        """System prompt, then the history, with this turn's memory facts just before the latest user message."""
+        turn_start = max(i for i, message in enumerate(conversation_history) if message["role"] == "user")
+        return (
+            [{"role": "system", "content": system_prompt}]
+            + conversation_history[:turn_start]
+            + [{"role": "system", "content": memory_prompt}]
+            + conversation_history[turn_start:]
+        )
+
+    def chat(self, user_input: str, conversation_history: list, on_sentence=None, cancel_event=None):
         """
         Main chat function.
         It orchestrates the LLM, Tools, and Memory.
+        
+        If on_sentence is given, the replies are streamed and every complete
+        sentence is passed to on_sentence while the model is still generating.
+        Setting cancel_event (a threading.Event) stops a streamed reply early;
+        whatever was generated so far is kept in the history and returned.
         """
+        with tracer.span("chat"):
+            route = self.router.route(user_input, memory=self.memory) if self.fast_path else None
+            if route is not None:
+                return self._chat_fast_path(route, user_input, conversation_history, on_sentence)
+            if on_sentence is not None:
+                return self._chat_streaming(user_input, conversation_history, on_sentence, cancel_event)
+            return self._chat_blocking(user_input, conversation_history)
+
+    def _chat_blocking(self, user_input: str, conversation_history: list):
+        """chat() without streaming: each completion arrives in one piece."""
         
         # 1. Add the user's new message to the history
         conversation_history.append({"role": "user", "content": user_input})
         
-        # 2. Create the system prompt (with memory)
+        # 2. Create the system prompt and the relevant memory, and trim old history if over budget
         system_prompt = self.get_system_prompt()
+        memory_prompt = self.get_memory_prompt(user_input)
+        self.context.fit(conversation_history, system_prompt + memory_prompt)
         
         # 3. Build the full list of messages to send
-        messages_to_send = [
-            {"role": "system", "content": system_prompt},
-        ] + conversation_history
-        
-        # 4. Call the AI
-        response = self.client.chat.completions.create(
-            model="llama3-groq-tool-use:8b", # Using the correct tool-use model.
-            messages=messages_to_send,
-            tools=TOOL_MANIFEST, # Sending the NEW tool list
-            tool_choice="auto" 
-        )
+        messages_to_send = self._build_messages(system_prompt, memory_prompt, conversation_history)
         
-        response_message = response.choices[0].message
+        # 4. Call the AI, offering only the tools relevant to this message
+        tools = self._select_tools(user_input, conversation_history)
+        response_message = self._create_completion("completion_1", messages_to_send, tools=tools)
         
         # 5. Check if the AI wants to call a tool (The "Action Layer")
         if response_message.tool_calls:
-            conversation_history.append(response_message)
+            conversation_history.append(
+                {
+                    "role": "assistant",
+                    "content": response_message.content,
+                    "tool_calls": tool_calls_to_dicts(response_message.tool_calls),
+                }
+            )
             
-            for tool_call in response_message.tool_calls:
-                tool_result = call_tool(tool_call)
-                
-                conversation_history.append(
-                    {
-                        "role": "tool",
-                        "tool_call_id": tool_call.id,
-                        "name": tool_call.function.name,
-                        "content": tool_result,
-                    }
-                )
+            self._run_tools(response_message.tool_calls, conversation_history)
             
-            # 6. Call the AI *AGAIN* with the tool results
-            messages_to_send = [
-                {"role": "system", "content": system_prompt},
-            ] + conversation_history
-
-            final_response = self.client.chat.completions.create(
-                model="llama3-groq-tool-use:8b", # Using the correct tool-use model.
-                messages=messages_to_send
-            )
+            # 6. If the result can be read out as-is, no need to ask the AI to phrase it
+            final_message = self._speakable_reply(user_input, response_message.tool_calls, conversation_history)
+            if final_message is not None:
+                conversation_history.append({"role": "assistant", "content": final_message})
+                return final_message
             
-            final_message = final_response.choices[0].message.content
+            # 7. Otherwise call the AI *AGAIN* with the tool results
+            messages_to_send = self._build_messages(system_prompt, memory_prompt, conversation_history)
+
+            final_message = self._create_completion("completion_2", messages_to_send).content
             conversation_history.append({"role": "assistant", "content": final_message})
             return final_message
         
@@ -124,4 +304,200 @@ class CoreBrain:
             # No tool needed, just a simple chat response
             chat_response = response_message.content
             conversation_history.append({"role": "assistant", "content": chat_response})
-            return chat_response
\ No newline at end of file
+            return chat_response
+
+    def _chat_streaming(self, user_input: str, conversation_history: list, on_sentence, cancel_event=None):
+        """Same flow as chat(), but both completions are streamed sentence by sentence."""
+        started_at = time.perf_counter()
+        first_audio = []  # Local, so concurrent chat() calls (server mode) each time their own reply
+
+        def emit(sentence):
+            if not first_audio:
+                first_audio.append(time.perf_counter() - started_at)
+                print(f"[Latency] time-to-first-audio: {first_audio[0]:.2f}s")
+                tracer.annotate(time_to_first_audio=first_audio[0])
+            on_sentence(sentence)
+
+        conversation_history.append({"role": "user", "content": user_input})
+        system_prompt = self.get_system_prompt()
+        memory_prompt = self.get_memory_prompt(user_input)
+        self.context.fit(conversation_history, system_prompt + memory_prompt)
+        messages_to_send = self._build_messages(system_prompt, memory_prompt, conversation_history)
+
+        # 1. First completion: may answer directly or ask for tools
+        tools = self._select_tools(user_input, conversation_history)
+        content, tool_calls = self._stream_completion(
+            "completion_1", messages_to_send, emit, tools=tools, cancel_event=cancel_event
+        )
+
+        if not tool_calls or _is_cancelled(cancel_event):
+            conversation_history.append({"role": "assistant", "content": content})
+            return content
+
+        # 2. Run the tools, then stream the second completion with their results
+        conversation_history.append(
+            {"role": "assistant", "content": content or None, "tool_calls": tool_calls_to_dicts(tool_calls)}
+        )
+        self._run_tools(tool_calls, conversation_history)
+        if _is_cancelled(cancel_event):
+            conversation_history.append({"role": "assistant", "content": ""})
+            return ""
+
+        final_message = self._speakable_reply(user_input, tool_calls, conversation_history)
+        if final_message is not None:
+            emit(final_message)
+            conversation_history.append({"role": "assistant", "content": final_message})
+            return final_message
+
+        messages_to_send = self._build_messages(system_prompt, memory_prompt, conversation_history)
+        final_message, _ = self._stream_completion("completion_2", messages_to_send, emit, cancel_event=cancel_event)
+        conversation_history.append({"role": "assistant", "content": final_message})
+        return final_message
+
+    def _chat_fast_path(self, route, user_input: str, conversation_history: list, on_sentence=None):
+        """Answers a routed request with its tool and a template reply: no completions at all."""
+        started_at = time.perf_counter()
+        tracer.annotate(routed=route.intent)
+        print(f"[Router] {route.intent}: answering without the model")
+
+        # The history looks the same as if the model had called the tool itself
+        tool_call = route.tool_call()
+        conversation_history.append({"role": "user", "content": user_input})
+        conversation_history.append(
+            {"role": "assistant", "content": None, "tool_calls": tool_calls_to_dicts([tool_call])}
+        )
+        self._run_tools([tool_call], conversation_history)
+        reply = route.phrase(conversation_history[-1]["content"])
+        conversation_history.append({"role": "assistant", "content": reply})
+        self._record_skipped(2)
+
+        if on_sentence is not None:
+            tracer.annotate(time_to_first_audio=time.perf_counter() - started_at)
+            on_sentence(reply)
+        return reply
+
+    def _speakable_reply(self, user_input: str, tool_calls, conversation_history: list):
+        """
+        If the user's message is itself one of the router's simple requests and the
+        model answered it with that request's tool, returns the template reply (see
+        router.phrase_tool_result); otherwise None, and the model phrases the answer.
+        The template only fits those exact questions: "how many days until christmas"
+        also calls get_current_time, but "It's 9:34 PM" doesn't answer it.
+        Expects the tool's result to be the last message in the history.
+        """
+        if not self.fast_path or len(tool_calls) != 1:
+            return None
+        intent, _ = match_intent(user_input)
+        if intent is None or INTENT_TOOLS[intent] != tool_calls[0].function.name:
+            return None
+        try:
+            arguments = json.loads(tool_calls[0].function.arguments or "{}")
+        except ValueError:
+            return None
+        reply = phrase_tool_result(tool_calls[0].function.name, arguments, conversation_history[-1]["content"], intent)
+        if reply is not None:
+            tracer.annotate(phrased_by_template=tool_calls[0].function.name)
+            self._record_skipped(1)
+        return reply
+
+    def _record_skipped(self, completions: int):
+        self.router.record_skipped(completions, self._completion_seconds or 0.0)
+
+    def _select_tools(self, user_input: str, conversation_history: list) -> list:
+        """
+        The tool schemas for this turn (see ToolRegistry.select). Fewer schemas mean
+        a shorter prompt to prefill; an empty list means no tools are sent at all.
+        """
+        tools = registry.select(user_input, conversation_history)
+        tracer.annotate(tools_offered=[tool["function"]["name"] for tool in tools])
+        return tools
+
+    def _run_tools(self, tool_calls, conversation_history: list):
+        """Runs the tool calls in parallel and adds their results to the history in call order."""
+        for tool_call, tool_result, seconds in call_tools(tool_calls):
+            print(f"[Latency] tool {tool_call.function.name}: {seconds:.2f}s")
+            conversation_history.append(
+                {
+                    "role": "tool",
+                    "tool_call_id": tool_call.id,
+                    "name": tool_call.function.name,
+                    "content": tool_result,
+                }
+            )
+
+    def _create_completion(self, stage: str, messages_to_send: list, tools=None):
+        """
+        One completion whose reply is only used once it is complete. It is still
+        streamed from the server, so the trace gets the same queue/prefill/decode
+        breakdown as spoken replies. Returns a message with .content and .tool_calls.
+        """
+        content, tool_calls = self._stream_completion(stage, messages_to_send, lambda sentence: None, tools=tools)
+        return SimpleNamespace(content=content or None, tool_calls=tool_calls or None)
+
+    def _stream_completion(self, stage: str, messages_to_send: list, emit, tools=None, cancel_event=None):
+        """
+        Streams one completion. Text is chunked into sentences and passed to emit()
+        as soon as each sentence is complete. Returns (full_text, tool_calls).
+        If cancel_event gets set, the stream is closed and the text so far is returned.
+        """
+        request = {
+            "model": self.model,
+            "messages": messages_to_send,
+            "stream": True,
+            "stream_options": {"include_usage": True},
+        }
+        if tools:
+            request["tools"] = tools
+            request["tool_choice"] = "auto"
+
+        chunker = SentenceChunker()
+        tool_calls = ToolCallAccumulator()
+        parts = []
+
+        usage = None
+        first_token_at = None
+        with tracer.span(stage) as span:
+            queued_at = time.perf_counter()
+            with self._model_slots:
+                started_at = time.perf_counter()
+                stream = self.client.chat.completions.create(**request)
+                try:
+                    for chunk in stream:
+                        if _is_cancelled(cancel_event):
+                            # Closing the response tells the server to stop generating
+                            stream.close()
+                            span["cancelled"] = True
+                            return "".join(parts), []
+                        if chunk.usage:
+                            usage = chunk.usage
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta
+                        if first_token_at is None and (delta.content or delta.tool_calls):
+                            first_token_at = time.perf_counter()
+                        if delta.tool_calls:
+                            tool_calls.add(delta.tool_calls)
+                        if delta.content:
+                            parts.append(delta.content)
+                            for sentence in chunker.feed(delta.content):
+                                emit(sentence)
+                finally:
+                    self._last_request_at = time.monotonic()
+
+            # queue: waiting for a free slot; prefill: until the first token (includes
+            # a model load if Ollama had unloaded it); decode: generating the rest.
+            finished_at = time.perf_counter()
+            first_token_at = first_token_at or finished_at
+            span.update(self._record_timing(
+                started_at - queued_at, first_token_at - started_at, finished_at - first_token_at,
+                finished_at - queued_at, usage,
+            ))
+
+        for sentence in chunker.flush():
+            emit(sentence)
+
+        return "".join(parts), tool_calls.tool_calls()
+
+
+def _is_cancelled(cancel_event) -> bool:
+    return cancel_event is not None and cancel_event.is_set()
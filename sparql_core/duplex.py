@@ -0,0 +1,134 @@
+import asyncio
+import threading
+from .tracing import tracer
+
+GOODBYE = "Goodbye! Shutting down."
+
+
+class DuplexRuntime:
+    """
+    Full-duplex voice loop.
+
+    Listening, thinking and speaking run as three asyncio stages joined by
+    queues, so the microphone stays open while the assistant is talking:
+
+        capture --utterances--> think --sentences--> speak
+
+    If the user starts talking while a reply is still being generated or
+    spoken, that reply is cancelled (barge-in): the LLM stream is closed, queued
+    sentences are dropped and playback is stopped.
+
+    listener needs listen_for_command() and may have an on_speech_start hook;
+    speaker needs speak() and stop_speaking(). VoiceInterface provides all of
+    them; fake_audio.py has in-memory versions for running without audio.
+    Use headphones: otherwise the microphone hears the assistant's own voice.
+    """
+
+    def __init__(self, brain, listener, speaker=None):
+        self.brain = brain
+        self.listener = listener
+        self.speaker = speaker or listener
+        self.conversation_history = []
+        self.barge_ins = 0
+
+        self._generation = 0  # Bumped on every barge-in; older sentences are dropped
+        self._cancel_event = None  # Cancels the reply currently being generated
+        self._thinking = False
+        self._speaking = False
+
+    async def run(self):
+        """Runs until the user says 'exit'."""
+        self._loop = asyncio.get_running_loop()
+        self._utterances = asyncio.Queue()
+        self._sentences = asyncio.Queue()
+        self._done = asyncio.Event()
+
+        if hasattr(self.listener, "on_speech_start"):
+            self.listener.on_speech_start = lambda: self._loop.call_soon_threadsafe(self._on_speech_start)
+
+        stages = [
+            asyncio.create_task(self._capture_stage()),
+            asyncio.create_task(self._think_stage()),
+            asyncio.create_task(self._speak_stage()),
+        ]
+        await self._done.wait()
+        for stage in stages:
+            stage.cancel()
+        await asyncio.gather(*stages, return_exceptions=True)
+
+    # --- PIPELINE STAGES ---
+
+    async def _capture_stage(self):
+        while True:
+            text = await asyncio.to_thread(self.listener.listen_for_command)
+            if text:
+                self._on_speech_start()
+                await self._utterances.put(text)
+
+    async def _think_stage(self):
+        while True:
+            text = await self._utterances.get()
+            print(f"You: {text}")
+
+            if text.lower() == 'exit':
+                await self._sentences.put((self._generation, GOODBYE))
+                await self._sentences.put((self._generation, None))
+                return
+
+            generation = self._generation
+            self._cancel_event = cancel_event = threading.Event()
+
+            def on_sentence(sentence):
+                # Called from the brain's thread; hand the sentence to the event loop
+                self._loop.call_soon_threadsafe(self._sentences.put_nowait, (generation, sentence))
+
+            self._thinking = True
+            try:
+                # Traces the brain's work; playback is in a separate stage and isn't part of the turn here
+                with tracer.turn(mode="duplex"):
+                    await asyncio.to_thread(
+                        self.brain.chat, text, self.conversation_history,
+                        on_sentence=on_sentence, cancel_event=cancel_event,
+                    )
+            except Exception as e:
+                print(f"\n[ERROR] An unexpected error occurred: {e}")
+                await self._sentences.put((generation, "An error occurred. Restarting the conversation."))
+                self.conversation_history = []
+            finally:
+                self._thinking = False
+
+    async def _speak_stage(self):
+        while True:
+            generation, sentence = await self._sentences.get()
+            if sentence is None:
+                self._done.set()
+                return
+            if generation != self._generation:
+                continue  # Left over from a reply that was interrupted
+
+            self._speaking = True
+            try:
+                await asyncio.to_thread(self.speaker.speak, sentence)
+            finally:
+                self._speaking = False
+
+    # --- BARGE-IN ---
+
+    def _is_replying(self) -> bool:
+        """True while an uncancelled reply is being generated or spoken."""
+        if self._cancel_event is None or self._cancel_event.is_set():
+            return False
+        return self._thinking or self._speaking or not self._sentences.empty()
+
+    def _on_speech_start(self):
+        if self._is_replying():
+            self._barge_in()
+
+    def _barge_in(self):
+        self.barge_ins += 1
+        self._generation += 1
+        self._cancel_event.set()
+        while not self._sentences.empty():
+            self._sentences.get_nowait()
+        self.speaker.stop_speaking()
+        print("[Barge-in] Stopped the current reply.")
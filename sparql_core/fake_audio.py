@@ -0,0 +1,114 @@
+import queue
+import threading
+import time
+
+
+class FakeMicrophone:
+    """
+    In-memory stand-in for VoiceInterface's listening side, for running the
+    voice loops headless (no microphone, no Google ASR).
+
+    script is a list of utterances. Each entry is either "text" or
+    (delay_seconds, "text"): wait delay_seconds of silence, then "speak" the
+    text for words / words_per_second seconds and return it.
+    """
+
+    def __init__(self, script, words_per_second: float = 50.0, idle_wait: float = 0.05):
+        self.script = [entry if isinstance(entry, tuple) else (0.0, entry) for entry in script]
+        self.words_per_second = words_per_second
+        self.idle_wait = idle_wait
+        self.on_speech_start = None  # Set by the duplex runtime for barge-in
+        self._lock = threading.Lock()
+
+    @property
+    def exhausted(self) -> bool:
+        return not self.script
+
+    def listen_for_command(self) -> str:
+        with self._lock:
+            entry = self.script.pop(0) if self.script else None
+        if entry is None:
+            # Nothing left to say: behave like a listen that timed out
+            time.sleep(self.idle_wait)
+            return None
+
+        delay, text = entry
+        time.sleep(delay)
+        if self.on_speech_start is not None:
+            self.on_speech_start()
+        time.sleep(len(text.split()) / self.words_per_second)
+        return text
+
+
+class FakeSpeaker:
+    """
+    In-memory stand-in for VoiceInterface's speaking side.
+    "Plays" each sentence for words / words_per_second seconds and records it in
+    spoken, or in interrupted if stop_speaking() cut it off.
+    """
+
+    def __init__(self, words_per_second: float = 50.0):
+        self.words_per_second = words_per_second
+        self.spoken = []
+        self.interrupted = []
+        self._stop = threading.Event()
+        self._queue = queue.Queue()
+        self._worker = None
+
+    def speak(self, text: str):
+        if not text:
+            return
+        self._stop.clear()
+        if self._stop.wait(len(text.split()) / self.words_per_second):
+            self.interrupted.append(text)
+        else:
+            self.spoken.append(text)
+
+    def speak_async(self, text: str):
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._speech_loop, daemon=True)
+            self._worker.start()
+        self._queue.put(text)
+
+    def wait_until_spoken(self):
+        self._queue.join()
+
+    def stop_speaking(self):
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._queue.task_done()
+        self._stop.set()
+
+    def _speech_loop(self):
+        while True:
+            text = self._queue.get()
+            try:
+                self.speak(text)
+            finally:
+                self._queue.task_done()
+
+
+class FakeVoice:
+    """A FakeMicrophone and a FakeSpeaker behind VoiceInterface's full interface, for run_sparql_ai()."""
+
+    def __init__(self, microphone: FakeMicrophone, speaker: FakeSpeaker):
+        self.microphone = microphone
+        self.speaker = speaker
+
+    def listen_for_command(self) -> str:
+        return self.microphone.listen_for_command()
+
+    def speak(self, text: str):
+        self.speaker.speak(text)
+
+    def speak_async(self, text: str):
+        self.speaker.speak_async(text)
+
+    def wait_until_spoken(self):
+        self.speaker.wait_until_spoken()
+
+    def stop_speaking(self):
+        self.speaker.stop_speaking()
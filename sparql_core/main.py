@@ -1,42 +1,98 @@
+import argparse
+import time
 from .core_brain import CoreBrain
+from .tracing import DEFAULT_TRACE_FILE, tracer
 from .voice_interface import VoiceInterface
 
-def run_sparql_ai():
+_imported_at = time.perf_counter()
+
+def run_sparql_ai(brain=None, voice=None):
+    """
+    The voice loop. brain and voice can be passed in (e.g. a brain pointed at a
+    stub server and the fakes from fake_audio.py); otherwise the real ones are built.
+    """
     print("🚀 SPARQL.AI v0.2 (Voice Edition) is online.")
     print("Say 'exit' to end the session.")
     print("-" * 30)
     
-    brain = CoreBrain()
-    voice = VoiceInterface()
+    if brain is None:
+        brain = CoreBrain()
+        brain.warm_up()  # Loads the model in the background while the microphone starts up
+    if voice is None:
+        voice = VoiceInterface()
+        print(f"[Startup] Listening {time.perf_counter() - _imported_at:.2f}s after start-up")
     
     conversation_history = [] 
 
     while True:
         try:
-            # 1. Listen for your voice
-            user_input = voice.listen_for_command()
+            # Every pass through the loop is one traced turn (see tracing.py)
+            with tracer.turn() as turn:
+                # 1. Listen for your voice
+                user_input = voice.listen_for_command()
 
-            if user_input:
-                print(f"You: {user_input}")
-                
-                # 2. Check for the exit command
-                if user_input.lower() == 'exit':
-                    voice.speak("Goodbye! Shutting down.")
-                    break
+                if user_input:
+                    print(f"You: {user_input}")
+                    
+                    # 2. Check for the exit command
+                    if user_input.lower() == 'exit':
+                        voice.speak("Goodbye! Shutting down.")
+                        brain.router.print_stats()
+                        break
+                    
+                    # 3. Get response from the brain, speaking each sentence as soon as it is ready
+                    brain.chat(user_input, conversation_history, on_sentence=voice.speak_async)
+                    
+                    # 4. Wait for the rest of the response to be spoken
+                    voice.wait_until_spoken()
                 
-                # 3. Get response from the brain
-                response = brain.chat(user_input, conversation_history)
-                
-                # 4. Speak the response
-                voice.speak(response)
-            
-            else:
-                pass 
+                else:
+                    turn.discard()  # Nothing was heard; don't record an empty turn
         
         except Exception as e:
             print(f"\n[ERROR] An unexpected error occurred: {e}")
             voice.speak("An error occurred. Restarting the conversation.")
             conversation_history = []
             
+def run_sparql_ai_duplex():
+    """Same assistant, but listening, thinking and speaking run at the same time (with barge-in)."""
+    import asyncio
+    from .duplex import DuplexRuntime
+    
+    print("🚀 SPARQL.AI v0.2 (Voice Edition, full-duplex) is online.")
+    print("Say 'exit' to end the session. Start talking at any time to interrupt.")
+    print("-" * 30)
+    
+    brain = CoreBrain()
+    brain.warm_up()  # Loads the model in the background while the microphone starts up
+    voice = VoiceInterface()
+    print(f"[Startup] Listening {time.perf_counter() - _imported_at:.2f}s after start-up")
+    asyncio.run(DuplexRuntime(brain, voice).run())
+    brain.router.print_stats()
+            
 if __name__ == "__main__":
-    run_sparql_ai()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="SPARQL.AI voice assistant")
+    parser.add_argument("--duplex", action="store_true", help="listen while speaking and allow interrupting replies")
+    parser.add_argument(
+        "--trace", nargs="?", const=DEFAULT_TRACE_FILE, metavar="FILE",
+        help=f"write per-turn latency traces as JSONL (default file: {DEFAULT_TRACE_FILE}); "
+             "summarize with: python -m sparql_core.tracing FILE",
+    )
+    parser.add_argument(
+        "--profile-startup", action="store_true",
+        help="report the import cost of every module instead of starting (same as python -m sparql_core.startup)",
+    )
+    args = parser.parse_args()
+    
+    if args.profile_startup:
+        from .startup import print_report
+        print_report()
+        raise SystemExit
+    
+    if args.trace:
+        tracer.configure(args.trace)
+    
+    if args.duplex:
+        run_sparql_ai_duplex()
+    else:
+        run_sparql_ai()
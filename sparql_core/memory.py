@@ -1,42 +1,237 @@
+import contextlib
+import contextvars
 import json
 import os
+import sqlite3
+import threading
+from .retrieval import BM25Index, term_similarity, tokenize
+from .tracing import tracer
+
+DEFAULT_MEMORY_FILE = "long_term_memory.json"
+
+MIN_KEY_SCORE = 0.1  # find_key ignores index matches weaker than this
+
+# One MemoryManager per memory file, shared by the brain and the tools
+_shared_managers = {}
+_shared_lock = threading.Lock()
+
+# The memory file get_memory_manager() returns in this thread/task. The server
+# points it at a per-session file; tool threads copy the context, so tools
+# save into the same session's memory.
+_current_memory_file = contextvars.ContextVar("sparql_memory_file", default=DEFAULT_MEMORY_FILE)
+
+
+def get_memory_manager(memory_file=None):
+    """
+    Returns the process-wide MemoryManager for memory_file, creating it on first use.
+    memory_file defaults to the current one (see use_memory_file).
+    """
+    memory_file = memory_file or _current_memory_file.get()
+    path = os.path.abspath(memory_file)
+    with _shared_lock:
+        if path not in _shared_managers:
+            _shared_managers[path] = MemoryManager(memory_file)
+        return _shared_managers[path]
+
+
+@contextlib.contextmanager
+def use_memory_file(memory_file: str):
+    """Makes get_memory_manager() (and so the brain and the tools) use memory_file inside the block."""
+    token = _current_memory_file.set(memory_file)
+    try:
+        yield
+    finally:
+        _current_memory_file.reset(token)
+
+
+def close_memory_manager(memory_file: str):
+    """Closes and forgets the shared MemoryManager for memory_file (e.g. when a session ends)."""
+    with _shared_lock:
+        manager = _shared_managers.pop(os.path.abspath(memory_file), None)
+    if manager is not None:
+        manager.close()
+
 
 class MemoryManager:
+    """
+    Long-term memory backed by SQLite with an in-process cache.
+
+    Every fact is one row, so a save is a single-row atomic commit instead of a
+    rewrite of the whole file. Reads are served from the cache; the cache is
+    only reloaded when another process has committed to the database.
+    The old long_term_memory.json is imported the first time the database is created.
+
+    A BM25 index over keys and values (kept in step with every save) lets the
+    brain pull only the facts relevant to the current question.
+    """
+
     def __init__(self, memory_file="long_term_memory.json"):
         self.memory_file = memory_file
-        self._ensure_memory_file_exists()
+        self.db_file = os.path.splitext(memory_file)[0] + ".db"
+        self._lock = threading.RLock()
 
-    def _ensure_memory_file_exists(self):
-        """Creates the memory file if it doesn't exist."""
-        if not os.path.exists(self.memory_file):
-            with open(self.memory_file, 'w') as f:
-                json.dump({}, f)
+        self._cache = {}
+        self._cache_version = None
+        self._memory_string = None  # Cached output of get_all_memory_as_string()
+        self._index = BM25Index()
 
-    def _load_all(self) -> dict:
-        """Loads the entire memory dictionary from the file."""
+        self._connect()
+
+    def _connect(self):
+        """Opens the database and creates the table on first run."""
+        is_new = not os.path.exists(self.db_file)
+        # Each `with self._conn:` block below is one atomic transaction
+        self._conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS memory (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        if is_new:
+            self._import_legacy_json()
+
+    def _import_legacy_json(self):
+        """Copies facts from the old JSON memory file into the database."""
+        if not os.path.exists(self.memory_file):
+            return
         try:
             with open(self.memory_file, 'r') as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            return {}
+                legacy_data = json.load(f)
+        except (json.JSONDecodeError, OSError):
+            return
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO memory (key, value) VALUES (?, ?)",
+                [(key, json.dumps(value)) for key, value in legacy_data.items()],
+            )
+
+    def _refresh_cache(self):
+        """Reloads the cache only if the database was changed by another connection."""
+        # data_version changes whenever a different connection commits to the file
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._cache_version:
+            return
+        rows = self._conn.execute("SELECT key, value FROM memory").fetchall()
+        self._cache = {key: json.loads(value) for key, value in rows}
+        self._cache_version = version
+        self._memory_string = None
+        self._index = BM25Index()
+        for key, value in self._cache.items():
+            self._index.add(key, self._document(key, value))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def preload(self):
+        """Loads the cache and builds the search index now instead of on the first question."""
+        self._load_all()
+
+    def _load_all(self) -> dict:
+        """Returns the entire memory dictionary (from the cache)."""
+        with self._lock:
+            self._refresh_cache()
+            return self._cache
 
     def save(self, key: str, value: any):
         """Saves a single key-value pair to memory."""
-        memory_data = self._load_all()
-        memory_data[key] = value
-        with open(self.memory_file, 'w') as f:
-            json.dump(memory_data, f, indent=4)
+        with tracer.span("memory_save"), self._lock:
+            self._refresh_cache()
+            with self._conn:
+                self._conn.execute(
+                    "INSERT INTO memory (key, value) VALUES (?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                    (key, json.dumps(value)),
+                )
+            is_new_key = key not in self._cache
+            self._cache[key] = value
+            self._index.add(key, self._document(key, value))
+            if is_new_key and self._memory_string is not None:
+                # New facts can simply be appended to the cached prompt string
+                self._memory_string += f"\n- {key}: {value}"
+            else:
+                self._memory_string = None
 
     def load(self, key: str) -> any:
         """Loads a single value by its key."""
-        memory_data = self._load_all()
-        return memory_data.get(key)
-    
+        return self._load_all().get(key)
+
+    def find_key(self, key: str) -> str:
+        """
+        Returns the stored key that matches key: the exact key if it exists,
+        otherwise a close spelling of it ("favourite food" -> "favorite_food").
+        Every word of key must match a word of the stored key, so "favorite_food"
+        does not find "favorite_color". Returns None if nothing matches.
+        """
+        with self._lock:
+            memory_data = self._load_all()
+            if key in memory_data:
+                return key
+            wanted_terms = set(tokenize(key))
+            if not wanted_terms:
+                return None
+            for candidate, score in self._index.search(key, k=5):
+                if score < MIN_KEY_SCORE:
+                    break
+                if self._key_covers(candidate, wanted_terms):
+                    return candidate
+            return None
+
+    def _key_covers(self, stored_key: str, wanted_terms: set) -> bool:
+        """True if every wanted term is one of stored_key's words, or a close spelling of one."""
+        key_terms = set(tokenize(stored_key))
+        return all(
+            any(term_similarity(term, key_term) >= self._index.fuzzy_similarity for key_term in key_terms)
+            for term in wanted_terms
+        )
+
+    def search(self, query: str, k: int = 5, fuzzy: bool = True) -> list:
+        """Returns up to k (key, value) pairs most relevant to query, best first."""
+        with self._lock:
+            memory_data = self._load_all()
+            return [(key, memory_data[key]) for key, _ in self._index.search(query, k, fuzzy)]
+
+    def get_relevant_memory_as_string(self, query: str, k: int = 8, max_tokens: int = 300) -> str:
+        """
+        The facts to put in the prompt for query. If the whole memory fits in
+        max_tokens it is returned as is, since standing facts like "who am I" or
+        a spelling preference may share no words with the question. Otherwise
+        only the top-k facts for query, within max_tokens. The ranking runs
+        every turn, so it matches exact words only (no fuzzy spelling matches),
+        which keeps its cost flat as the vocabulary grows.
+        """
+        with self._lock:
+            # Every fact takes at least one token, so a large store is never formatted whole here
+            if len(self._load_all()) <= max_tokens:
+                all_memory = self.get_all_memory_as_string()
+                if len(all_memory) // 4 + all_memory.count("\n") + 1 <= max_tokens:
+                    return all_memory
+
+        lines = []
+        used_tokens = 0
+        with tracer.span("memory_search"):
+            results = self.search(query, k, fuzzy=False)
+        for key, value in results:
+            line = f"- {key}: {value}"
+            used_tokens += len(line) // 4 + 1
+            if lines and used_tokens > max_tokens:
+                break
+            lines.append(line)
+        if not lines:
+            return "No relevant long-term memories found."
+        return "\n".join(lines)
+
+    @staticmethod
+    def _document(key: str, value) -> str:
+        """The text indexed for one fact. The key is repeated so it counts more than the value."""
+        return f"{key} {key} {value}"
+
     def get_all_memory_as_string(self) -> str:
         """Returns the entire memory as a formatted string."""
-        memory_data = self._load_all()
-        if not memory_data:
-            return "No long-term memories found."
-        
-        # Format as a simple string for the AI prompt
-        return "\n".join([f"- {key}: {value}" for key, value in memory_data.items()])
\ No newline at end of file
+        with self._lock:
+            memory_data = self._load_all()
+            if not memory_data:
+                return "No long-term memories found."
+
+            if self._memory_string is None:
+                # Format as a simple string for the AI prompt
+                self._memory_string = "\n".join([f"- {key}: {value}" for key, value in memory_data.items()])
+            return self._memory_string
@@ -0,0 +1,146 @@
+import heapq
+import math
+import re
+from collections import defaultdict
+
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "to", "of", "in", "on", "at", "for",
+    "and", "or", "it", "that", "this", "what", "who", "whats", "do", "does", "did", "i", "me",
+    "my", "you", "your", "can", "could", "please", "tell", "about", "with", "as", "by",
+}
+
+
+def tokenize(text) -> list:
+    """
+    Lower-cased word tokens without stopwords.
+    Memory keys like "favoriteFood" or "user_name" are split into their words.
+    """
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", str(text))
+    return [word for word in re.findall(r"[a-z0-9]+", text.lower()) if word not in STOPWORDS]
+
+
+def _common_prefix_length(a: str, b: str) -> int:
+    length = 0
+    for char_a, char_b in zip(a, b):
+        if char_a != char_b:
+            break
+        length += 1
+    return length
+
+
+def _trigrams(term: str) -> set:
+    padded = f" {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def term_similarity(a: str, b: str) -> float:
+    """How alike two words are (0 to 1): trigram overlap or shared prefix, whichever is higher."""
+    if a == b:
+        return 1.0
+    trigrams_a, trigrams_b = _trigrams(a), _trigrams(b)
+    return max(
+        len(trigrams_a & trigrams_b) / len(trigrams_a | trigrams_b),
+        _common_prefix_length(a, b) / max(len(a), len(b)),
+    )
+
+
+class BM25Index:
+    """
+    Small in-memory BM25 index that is updated one document at a time.
+
+    Query words that aren't in the index are matched to similar indexed words
+    by character trigrams or a long shared prefix, so "favourite" still finds
+    "favorite" and "colour" finds "color".
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, fuzzy_similarity: float = 0.5):
+        self.k1 = k1
+        self.b = b
+        self.fuzzy_similarity = fuzzy_similarity
+        self._postings = defaultdict(dict)  # term -> {doc_id: term frequency}
+        self._doc_terms = {}  # doc_id -> {term: term frequency}
+        self._doc_lengths = {}  # doc_id -> number of terms
+        self._total_length = 0
+        self._trigram_terms = defaultdict(set)  # trigram -> terms containing it
+        self._term_trigrams = {}  # term -> its trigrams, computed once when the term is indexed
+
+    def __len__(self):
+        return len(self._doc_terms)
+
+    def add(self, doc_id, text: str):
+        """Adds a document, replacing any earlier version with the same id."""
+        self.remove(doc_id)
+        term_counts = defaultdict(int)
+        for term in tokenize(text):
+            term_counts[term] += 1
+        self._doc_terms[doc_id] = dict(term_counts)
+        self._doc_lengths[doc_id] = sum(term_counts.values())
+        self._total_length += self._doc_lengths[doc_id]
+        for term, count in term_counts.items():
+            if term not in self._postings:
+                self._term_trigrams[term] = _trigrams(term)
+                for trigram in self._term_trigrams[term]:
+                    self._trigram_terms[trigram].add(term)
+            self._postings[term][doc_id] = count
+
+    def remove(self, doc_id):
+        term_counts = self._doc_terms.pop(doc_id, None)
+        if term_counts is None:
+            return
+        self._total_length -= self._doc_lengths.pop(doc_id)
+        for term in term_counts:
+            postings = self._postings[term]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[term]
+                for trigram in self._term_trigrams.pop(term):
+                    self._trigram_terms[trigram].discard(term)
+
+    def search(self, query: str, k: int = 5, fuzzy: bool = True) -> list:
+        """
+        Returns up to k (doc_id, score) pairs, best first.
+        With fuzzy=False only exact terms count, and the cost no longer depends on the vocabulary size.
+        """
+        if not self._doc_terms:
+            return []
+        doc_count = len(self._doc_terms)
+        average_length = self._total_length / doc_count or 1.0
+
+        scores = defaultdict(float)
+        for query_term in set(tokenize(query)):
+            expansions = self._expand(query_term) if fuzzy else [(query_term, 1.0)] * (query_term in self._postings)
+            for term, weight in expansions:
+                postings = self._postings[term]
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, frequency in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[doc_id] / average_length)
+                    scores[doc_id] += weight * idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def _expand(self, query_term: str) -> list:
+        """The term itself if indexed, otherwise similar indexed terms weighted by similarity."""
+        if query_term in self._postings:
+            return [(query_term, 1.0)]
+        query_trigrams = _trigrams(query_term)
+        # A term needs min_shared trigrams in common to be similar enough. Any such term
+        # contains at least one of the query's len - min_shared + 1 rarest trigrams, so
+        # only those are looked up, and common trigrams (in thousands of terms) are skipped.
+        min_shared = max(2, len(query_trigrams) // 3)
+        rarest = sorted(query_trigrams, key=lambda trigram: len(self._trigram_terms.get(trigram, ())))
+        candidates = set()
+        for trigram in rarest[:len(rarest) - min_shared + 1]:
+            candidates |= self._trigram_terms.get(trigram, set())
+        matches = []
+        for term in candidates:
+            term_trigrams = self._term_trigrams[term]
+            shared = len(query_trigrams & term_trigrams)
+            if shared < min_shared:
+                continue
+            similarity = max(
+                shared / (len(query_trigrams) + len(term_trigrams) - shared),
+                _common_prefix_length(query_term, term) / max(len(query_term), len(term)),
+            )
+            if similarity >= self.fuzzy_similarity:
+                matches.append((term, similarity))
+        return matches
@@ -0,0 +1,198 @@
+import datetime
+import itertools
+import json
+import re
+import threading
+from collections import Counter
+from types import SimpleNamespace
+from .retrieval import tokenize
+
+# Only utterances that match one of these patterns from start to end are
+# routed, so "what time is it in London" still goes to the model.
+TIME_PATTERN = re.compile(r"(?:what(?:'s| is) the (?:current )?time|what time is it|tell me the time)(?: now| right now)?(?: please)?")
+DATE_PATTERN = re.compile(r"(?:what(?:'s| is) (?:the date|today's date)|what day is it)(?: today)?(?: please)?")
+# Matched against the original utterance, so the value keeps its case and symbols
+# (only the full stop speech recognition puts at the end is dropped)
+REMEMBER_PATTERN = re.compile(r"(?:please\s+)?remember(?:\s+that)?\s+my\s+(?P<key>[a-z][a-z ]{0,40}?)\s+(?:is|are)\s+(?P<value>.+)", re.I | re.S)
+RECALL_PATTERN = re.compile(r"what(?:'s| is| are) my (?P<key>[a-z][a-z ]{0,40})")
+
+_call_ids = itertools.count(1)
+
+
+def normalize_utterance(text: str) -> str:
+    """Lowercase, single spaces, no trailing punctuation (ASR adds it inconsistently)."""
+    return " ".join(text.lower().split()).rstrip(" ?.!")
+
+
+# The tool that answers each intent
+INTENT_TOOLS = {
+    "time": "get_current_time",
+    "date": "get_current_time",
+    "remember": "save_to_memory",
+    "recall": "load_from_memory",
+}
+
+
+def match_intent(user_input: str) -> tuple:
+    """
+    Returns (intent, regex match) if the whole utterance is one of the simple
+    requests above, else (None, None). Doesn't check memory or count anything.
+    """
+    text = normalize_utterance(user_input)
+    if match := TIME_PATTERN.fullmatch(text):
+        return "time", match
+    if match := DATE_PATTERN.fullmatch(text):
+        return "date", match
+    if match := REMEMBER_PATTERN.fullmatch(user_input.strip()):
+        return "remember", match
+    if match := RECALL_PATTERN.fullmatch(text):
+        return "recall", match
+    return None, None
+
+
+def _spoken_value(value: str) -> str:
+    """The value as spoken, minus surrounding whitespace and one trailing full stop (added by ASR)."""
+    value = value.strip()
+    return value[:-1].rstrip() if value.endswith(".") else value
+
+
+def _is_stored(memory, key: str) -> bool:
+    """
+    True only if memory has this very key (up to case, spaces and underscores).
+    A close match like favorite_color for "favorite food" isn't good enough to
+    answer without the model.
+    """
+    found = memory.find_key(key)
+    return found is not None and tokenize(found) == tokenize(key)
+
+
+def _readable_key(key: str) -> str:
+    return key.replace("_", " ")
+
+
+def _sentence_end(value: str) -> str:
+    """The full stop to end a sentence with value, unless value already ends one."""
+    return "" if value.endswith((".", "!", "?")) else "."
+
+
+def phrase_tool_result(name: str, arguments: dict, result: str, intent: str = None) -> str:
+    """
+    Turns one tool result into a sentence that can be spoken as-is, or returns
+    None if it needs the model to phrase it (search results, errors...).
+    """
+    if result.startswith("Error"):
+        return None
+
+    if name == "get_current_time":
+        try:
+            now = datetime.datetime.fromisoformat(result)
+        except ValueError:
+            return None
+        if intent == "date":
+            return f"Today is {now:%A}, {now.day} {now:%B %Y}."
+        return f"It's {now.hour % 12 or 12}:{now:%M %p} on {now:%A}, {now.day} {now:%B}."
+
+    if name == "save_to_memory" and result.startswith("Successfully saved"):
+        value = str(arguments.get("value"))
+        return f"Okay, I'll remember that your {_readable_key(arguments.get('key', 'that'))} is {value}{_sentence_end(value)}"
+
+    if name == "load_from_memory":
+        found = re.fullmatch(r"Retrieved (.+?) = (.*) from long-term memory\.", result, re.S)
+        if found:
+            return f"Your {_readable_key(found.group(1))} is {found.group(2)}{_sentence_end(found.group(2))}"
+        if result.startswith("No value found"):
+            key = _readable_key(arguments.get("key", ""))
+            return f"I don't know your {key} yet. You can tell me by saying 'remember that my {key} is ...'."
+
+    return None
+
+
+class Route:
+    """A matched intent: the one tool call that answers it."""
+
+    def __init__(self, intent: str, tool_name: str, arguments: dict):
+        self.intent = intent
+        self.tool_name = tool_name
+        self.arguments = arguments
+
+    def tool_call(self):
+        """The tool call in the same shape call_tools() expects from the SDK."""
+        return SimpleNamespace(
+            id=f"call_router_{next(_call_ids)}",
+            type="function",
+            function=SimpleNamespace(name=self.tool_name, arguments=json.dumps(self.arguments)),
+        )
+
+    def phrase(self, result: str) -> str:
+        return phrase_tool_result(self.tool_name, self.arguments, result, self.intent) or (
+            "Sorry, I couldn't do that right now."
+        )
+
+
+class IntentRouter:
+    """
+    Deterministic fast path in front of the model.
+
+    Requests like "what time is it", "remember that my X is Y" and "what is my X"
+    are answered by calling the tool directly and phrasing its result with a
+    template, instead of one completion to pick the tool and another to word
+    the answer. Everything else goes to the model as usual.
+
+    If route() gets the MemoryManager, "what is my X" is only routed when X
+    itself is stored, so questions memory can't answer still reach the model.
+    """
+
+    def __init__(self):
+        self.hits = Counter()  # Routed turns per intent
+        self.misses = 0
+        self.completions_skipped = 0
+        self.seconds_saved = 0.0
+        self._lock = threading.Lock()
+
+    def route(self, user_input: str, memory=None):
+        """Returns a Route if user_input is a high-confidence match, else None."""
+        intent, match = match_intent(user_input)
+        route = None
+        if intent in ("time", "date"):
+            route = Route(intent, INTENT_TOOLS[intent], {})
+        elif intent == "remember":
+            key = "_".join(match.group("key").lower().split())
+            route = Route(intent, INTENT_TOOLS[intent], {"key": key, "value": _spoken_value(match.group("value"))})
+        elif intent == "recall":
+            key = match.group("key").strip().replace(" ", "_")
+            if memory is None or _is_stored(memory, key):
+                route = Route(intent, INTENT_TOOLS[intent], {"key": key})
+
+        with self._lock:
+            if route is None:
+                self.misses += 1
+            else:
+                self.hits[route.intent] += 1
+        return route
+
+    def record_skipped(self, completions: int, seconds_per_completion: float):
+        """Counts completions that weren't needed, valued at the recent average completion time."""
+        with self._lock:
+            self.completions_skipped += completions
+            self.seconds_saved += completions * seconds_per_completion
+
+    def stats(self) -> dict:
+        with self._lock:
+            routed = sum(self.hits.values())
+            total = routed + self.misses
+            return {
+                "routed": routed,
+                "total": total,
+                "hit_rate": routed / total if total else 0.0,
+                "by_intent": dict(self.hits),
+                "completions_skipped": self.completions_skipped,
+                "seconds_saved": self.seconds_saved,
+            }
+
+    def print_stats(self):
+        stats = self.stats()
+        print(
+            f"[Router] answered {stats['routed']}/{stats['total']} turns without the model "
+            f"({stats['hit_rate']:.0%}), skipped {stats['completions_skipped']} completions, "
+            f"saved ~{stats['seconds_saved']:.1f}s"
+        )
@@ -0,0 +1,154 @@
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# How long a cached result stays fresh, by kind of query (seconds).
+# Checked in order; the first matching pattern wins.
+QUERY_CLASS_TTLS = [
+    ("news", re.compile(r"\b(news|latest|today|tonight|breaking|live|score|scores|stock|price|now)\b"), 10 * 60),
+    ("weather", re.compile(r"\b(weather|temperature|forecast|rain|humidity)\b"), 30 * 60),
+]
+DEFAULT_QUERY_CLASS = "facts"
+DEFAULT_TTL = 7 * 24 * 60 * 60
+
+
+def normalize_query(query: str) -> str:
+    """
+    '  Weather in Ghaziabad? ' and 'weather in ghaziabad' share one cache entry.
+    Only case, whitespace and trailing ?!. change: symbols inside the query can
+    change its meaning ('c++ tutorial' vs 'c# tutorial', '2+2' vs '2*2').
+    """
+    return " ".join((query or "").lower().split()).rstrip("?!. ")
+
+
+def ttl_for_query(normalized_query: str):
+    """Returns (query_class, ttl_seconds) for an already-normalized query."""
+    for query_class, pattern, ttl in QUERY_CLASS_TTLS:
+        if pattern.search(normalized_query):
+            return query_class, ttl
+    return DEFAULT_QUERY_CLASS, DEFAULT_TTL
+
+
+class SearchCache:
+    """
+    Two-tier cache for search results.
+
+    Results live in an in-memory LRU and, if cache_file is set, in a small
+    SQLite table so they survive restarts. Concurrent lookups of the same query
+    share a single fetch: the first caller runs it, the others wait for its result.
+    """
+
+    def __init__(self, max_entries: int = 256, cache_file: str = None):
+        self.max_entries = max_entries
+        self.cache_file = cache_file
+        self._entries = OrderedDict()  # normalized query -> (result, expires_at)
+        self._in_flight = {}  # normalized query -> Future
+        self._lock = threading.Lock()
+        self._conn = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.shared_fetches = 0
+
+    def get_or_fetch(self, query: str, fetch) -> str:
+        """Returns the cached result for query, or calls fetch(query) and caches what it returns."""
+        key = normalize_query(query)
+        with self._lock:
+            result = self._get_fresh(key)
+            if result is not None:
+                return result
+            future = self._in_flight.get(key)
+            is_leader = future is None
+            if is_leader:
+                self.misses += 1
+                future = self._in_flight[key] = Future()
+            else:
+                self.shared_fetches += 1
+
+        if not is_leader:
+            return future.result()
+
+        try:
+            result = fetch(query)
+        except BaseException as e:
+            # Failures are not cached; the waiting callers see the same error
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            self.put(key, result)
+            return result
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def put(self, key: str, result: str):
+        """Stores a result under an already-normalized key."""
+        _, ttl = ttl_for_query(key)
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._remember(key, result, expires_at)
+            conn = self._disk()
+            if conn is not None:
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO search_cache (query, result, expires_at) VALUES (?, ?, ?)",
+                        (key, result, expires_at),
+                    )
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.shared_fetches
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "shared_fetches": self.shared_fetches,
+                "hit_rate": (self.hits + self.shared_fetches) / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+            }
+
+    def _get_fresh(self, key: str):
+        """Looks in memory, then on disk. Caller must hold the lock."""
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            result, expires_at = entry
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return result
+            del self._entries[key]
+
+        conn = self._disk()
+        if conn is not None:
+            row = conn.execute(
+                "SELECT result, expires_at FROM search_cache WHERE query = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row is not None:
+                self._remember(key, row[0], row[1])
+                self.hits += 1
+                self.disk_hits += 1
+                return row[0]
+        return None
+
+    def _remember(self, key: str, result: str, expires_at: float):
+        self._entries[key] = (result, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _disk(self):
+        """Opens the on-disk tier on first use (None if it is disabled)."""
+        if self.cache_file and self._conn is None:
+            self._conn = sqlite3.connect(self.cache_file, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS search_cache (query TEXT PRIMARY KEY, result TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            with self._conn:
+                self._conn.execute("DELETE FROM search_cache WHERE expires_at <= ?", (time.time(),))
+        return self._conn
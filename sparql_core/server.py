@@ -0,0 +1,529 @@
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import re
+import secrets
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import urlsplit
+
+from .core_brain import MAX_CONCURRENT_REQUESTS, OLLAMA_BASE_URL, CoreBrain
+from .memory import close_memory_manager, use_memory_file
+from .tools import set_tool_workers
+from .tracing import DEFAULT_TRACE_FILE, tracer
+
+# --- SERVER SETTINGS ---
+SESSION_MEMORY_DIR = "session_memory"  # One long-term memory file per user namespace
+SESSION_IDLE_SECONDS = 30 * 60         # Sessions unused this long are dropped
+MAX_PENDING_TURNS = 64                 # Turns admitted at once (running or queued for a model slot); more get 503
+MAX_BODY_BYTES = 1 << 20
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC11B85"
+
+_NAMESPACE = re.compile(r"[A-Za-z0-9_-]{1,64}")
+_SESSION_PATH = re.compile(r"/sessions/(?P<session_id>[A-Za-z0-9_-]+)(?P<action>/chat|/ws)?")
+
+
+class ServerBusy(Exception):
+    """Raised when MAX_PENDING_TURNS turns are already admitted."""
+
+
+class AccessDenied(Exception):
+    """Raised when a session asks for a user namespace without that user's token."""
+
+
+class SessionClosed(Exception):
+    """Raised when a turn is sent to a session that was closed in the meantime."""
+
+
+class Session:
+    """One client conversation: its own history and memory namespace, one turn at a time."""
+
+    def __init__(self, session_id: str, namespace: str, anonymous: bool = False):
+        self.session_id = session_id
+        self.namespace = namespace
+        self.anonymous = anonymous  # Its namespace is the session id: nobody can reach it after the session
+        self.closed = False
+        self.memory_file = os.path.join(SESSION_MEMORY_DIR, f"{namespace}.json")
+        self.issued_token = None  # Set when this session claimed a new user namespace
+        self.conversation_history = []
+        self.turns = 0
+        self.last_used = time.monotonic()
+        self.lock = asyncio.Lock()  # Turns of one session run in order
+
+
+class Request:
+    def __init__(self, method: str, target: str, headers: dict, body: bytes):
+        self.method = method
+        self.path = urlsplit(target).path.rstrip("/") or "/"
+        self.headers = headers
+        self.body = body
+
+    def json(self) -> dict:
+        data = json.loads(self.body) if self.body else {}
+        if not isinstance(data, dict):
+            raise ValueError("expected a JSON object")
+        return data
+
+    @property
+    def keep_alive(self) -> bool:
+        return self.headers.get("connection", "").lower() != "close"
+
+
+class SparqlServer:
+    """
+    Serves one CoreBrain to many concurrent text and voice clients.
+
+        POST   /sessions               {"user": "alice", "token": ...} -> {"session_id": ..., "token": ...}
+        POST   /sessions/<id>/chat     {"message": "...", "stream": false} -> {"reply": ...}
+                                       with "stream": true the reply comes back as
+                                       server-sent events, one per sentence
+        GET    /sessions/<id>/ws       WebSocket: send {"message": ...} (or plain text),
+                                       get {"type": "sentence"} frames and then {"type": "done"}.
+                                       A new message or {"type": "cancel"} interrupts
+                                       the current reply (barge-in)
+        DELETE /sessions/<id>          409 while one of its turns is running
+        GET    /stats
+
+    Every session has its own conversation history. Its long-term memory lives in
+    SESSION_MEMORY_DIR/<user>.json, so a user's facts carry over between sessions
+    and never leak into other users'. The first session for a user gets a token
+    back; later sessions for that user must send it, or get 403. Sessions without
+    a user get a private namespace of their own. This is the only access control:
+    there is no TLS, so keep the server on loopback (the default --host) or behind
+    a proxy that adds it. All sessions share the brain's pooled model
+    client; brain.max_concurrent_requests caps the requests sent to the model
+    server and the rest wait their turn (reported as "queue" time). Voice clients
+    run speech recognition and TTS on their side and talk to the WebSocket.
+    """
+
+    def __init__(self, brain: CoreBrain, max_pending: int = MAX_PENDING_TURNS):
+        self.brain = brain
+        self.max_pending = max_pending
+        self.sessions = {}
+        self.port = None
+        self.ready = threading.Event()  # Set once the server is accepting connections
+        self._pending = 0
+        self._turns = 0
+        self._rejected = 0
+        # Turns run on these threads; most of their time is spent waiting on the model
+        self._executor = ThreadPoolExecutor(max_workers=max_pending, thread_name_prefix="sparql-session")
+        # Every admitted turn may be running tools at the same time
+        set_tool_workers(max_pending)
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765):
+        server = await asyncio.start_server(self._handle_connection, host, port)
+        self.port = server.sockets[0].getsockname()[1]
+        print(f"🚀 SPARQL.AI server listening on http://{host}:{self.port}")
+        self.ready.set()
+        async with server:
+            await server.serve_forever()
+
+    # --- SESSIONS ---
+
+    def create_session(self, user: str = None, token: str = None) -> Session:
+        """
+        Opens a session for user (or an anonymous one). The first session for a user
+        claims the namespace and gets session.issued_token; later ones must pass that
+        token, otherwise AccessDenied is raised.
+        """
+        self._evict_idle_sessions()
+        os.makedirs(SESSION_MEMORY_DIR, exist_ok=True)
+        session_id = secrets.token_urlsafe(12)
+        session = Session(session_id, user or session_id, anonymous=user is None)
+        if user is not None:
+            session.issued_token = _check_user_token(user, token)
+        self.sessions[session_id] = session
+        return session
+
+    def close_session(self, session_id: str) -> bool:
+        """
+        Closes the session, unless one of its turns is running (returns False then).
+        An anonymous session's memory files are deleted with it.
+        """
+        session = self.sessions.get(session_id)
+        if session is None:
+            return True
+        if session.lock.locked():
+            return False
+        del self.sessions[session_id]
+        session.closed = True
+        if not any(s.namespace == session.namespace for s in self.sessions.values()):
+            close_memory_manager(session.memory_file)
+            if session.anonymous:
+                _delete_memory_files(session.memory_file)
+        return True
+
+    def _evict_idle_sessions(self):
+        now = time.monotonic()
+        for session in list(self.sessions.values()):
+            if now - session.last_used > SESSION_IDLE_SECONDS and not session.lock.locked():
+                self.close_session(session.session_id)
+
+    async def run_turn(self, session: Session, message: str, on_sentence=None, cancel_event=None) -> str:
+        """Runs one chat turn for session on a worker thread. Raises ServerBusy if too many are admitted."""
+        if self._pending >= self.max_pending:
+            self._rejected += 1
+            raise ServerBusy()
+        self._pending += 1
+        try:
+            async with session.lock:
+                if session.closed:
+                    raise SessionClosed()
+                session.last_used = time.monotonic()
+                reply = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, self._chat, session, message, on_sentence, cancel_event
+                )
+                session.turns += 1
+                self._turns += 1
+                return reply
+        finally:
+            self._pending -= 1
+
+    def _chat(self, session: Session, message: str, on_sentence, cancel_event) -> str:
+        with use_memory_file(session.memory_file), tracer.turn(mode="server", session=session.session_id):
+            try:
+                return self.brain.chat(
+                    message, session.conversation_history, on_sentence=on_sentence, cancel_event=cancel_event
+                )
+            except Exception as e:
+                print(f"\n[ERROR] Session {session.session_id}: {e}")
+                session.conversation_history.clear()
+                return "An error occurred. Restarting the conversation."
+
+    async def stream_turn(self, session: Session, message: str, send_sentence, cancel_event=None) -> str:
+        """
+        Runs one turn and awaits send_sentence(sentence) for each sentence as it is
+        generated. If sending fails (the client went away), the reply is cancelled.
+        """
+        loop = asyncio.get_running_loop()
+        cancel_event = cancel_event or threading.Event()
+        sentences = asyncio.Queue()
+
+        def on_sentence(sentence):
+            # Called from the worker thread; hand the sentence to the event loop
+            loop.call_soon_threadsafe(sentences.put_nowait, sentence)
+
+        turn = asyncio.ensure_future(self.run_turn(session, message, on_sentence, cancel_event))
+        turn.add_done_callback(lambda _: sentences.put_nowait(None))
+        while (sentence := await sentences.get()) is not None:
+            if cancel_event.is_set():
+                continue
+            try:
+                await send_sentence(sentence)
+            except (ConnectionError, OSError):
+                cancel_event.set()
+        return await turn
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self.sessions),
+            "pending_turns": self._pending,
+            "turns": self._turns,
+            "rejected": self._rejected,
+            "model_slots": self.brain.max_concurrent_requests,
+            "router": self.brain.router.stats(),
+        }
+
+    # --- HTTP ---
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                if not await self._dispatch(request, reader, writer):
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except ValueError as e:
+            await _send_json(writer, 400, {"error": str(e)}, keep_alive=False)
+        finally:
+            writer.close()
+
+    async def _dispatch(self, request: Request, reader, writer) -> bool:
+        """Handles one request. Returns False if the connection should be closed afterwards."""
+        if request.method == "GET" and request.path == "/stats":
+            return await _send_json(writer, 200, self.stats(), request.keep_alive)
+
+        if request.method == "POST" and request.path == "/sessions":
+            body = request.json()
+            user = body.get("user")
+            if user is not None and not _NAMESPACE.fullmatch(user):
+                return await _send_json(writer, 400, {"error": "user must match [A-Za-z0-9_-]{1,64}"}, request.keep_alive)
+            try:
+                session = self.create_session(user, body.get("token"))
+            except AccessDenied:
+                return await _send_json(writer, 403, {"error": f"a valid token for user {user} is required"}, request.keep_alive)
+            response = {"session_id": session.session_id, "user": session.namespace}
+            if session.issued_token:
+                response["token"] = session.issued_token
+            return await _send_json(writer, 201, response, request.keep_alive)
+
+        match = _SESSION_PATH.fullmatch(request.path)
+        session = self.sessions.get(match.group("session_id")) if match else None
+        if session is None:
+            return await _send_json(writer, 404, {"error": "unknown session or path"}, request.keep_alive)
+        action = match.group("action")
+
+        if request.method == "DELETE" and action is None:
+            if not self.close_session(session.session_id):
+                return await _send_json(writer, 409, {"error": "a turn is running, retry when it is done"}, request.keep_alive)
+            return await _send_json(writer, 200, {"closed": session.session_id}, request.keep_alive)
+
+        if request.method == "POST" and action == "/chat":
+            body = request.json()
+            message = (body.get("message") or "").strip()
+            if not message:
+                return await _send_json(writer, 400, {"error": "message is required"}, request.keep_alive)
+            if body.get("stream"):
+                await self._chat_sse(session, message, writer)
+                return False
+            started_at = time.perf_counter()
+            try:
+                reply = await self.run_turn(session, message)
+            except ServerBusy:
+                return await _send_json(writer, 503, {"error": "server busy, retry later"}, request.keep_alive)
+            except SessionClosed:
+                return await _send_json(writer, 404, {"error": "session closed"}, request.keep_alive)
+            return await _send_json(
+                writer, 200, {"reply": reply, "seconds": time.perf_counter() - started_at}, request.keep_alive
+            )
+
+        if request.method == "GET" and action == "/ws":
+            await self._websocket(session, request, reader, writer)
+            return False
+
+        return await _send_json(writer, 405, {"error": "method not allowed"}, request.keep_alive)
+
+    async def _chat_sse(self, session: Session, message: str, writer):
+        """Streams one reply as server-sent events: "sentence" events, then one "done" event."""
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n"
+        )
+
+        async def send_event(event: str, payload: dict):
+            writer.write(f"event: {event}\ndata: {json.dumps(payload)}\n\n".encode())
+            await writer.drain()
+
+        started_at = time.perf_counter()
+        try:
+            reply = await self.stream_turn(session, message, lambda sentence: send_event("sentence", {"text": sentence}))
+            await send_event("done", {"reply": reply, "seconds": time.perf_counter() - started_at})
+        except ServerBusy:
+            await send_event("error", {"error": "server busy, retry later"})
+        except SessionClosed:
+            await send_event("error", {"error": "session closed"})
+
+    # --- WEBSOCKET ---
+
+    async def _websocket(self, session: Session, request: Request, reader, writer):
+        key = request.headers.get("sec-websocket-key")
+        if request.headers.get("upgrade", "").lower() != "websocket" or not key:
+            await _send_json(writer, 400, {"error": "expected a WebSocket upgrade"}, keep_alive=False)
+            return
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+        writer.write(
+            "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode()
+        )
+        await writer.drain()
+
+        async def send(payload: dict):
+            writer.write(_websocket_frame(0x1, json.dumps(payload).encode()))
+            await writer.drain()
+
+        # Messages are read on their own task, so a new one can interrupt the reply in progress
+        messages = asyncio.Queue()
+        current = {"cancel_event": None}
+
+        async def read_messages():
+            try:
+                while True:
+                    opcode, payload = await _read_websocket_message(reader)
+                    if opcode == 0x8:  # Close
+                        writer.write(_websocket_frame(0x8, payload[:2]))
+                        break
+                    if opcode == 0x9:  # Ping
+                        writer.write(_websocket_frame(0xA, payload))
+                        continue
+                    if opcode != 0x1:
+                        continue
+                    text = payload.decode("utf-8", errors="replace")
+                    try:
+                        data = json.loads(text)
+                    except ValueError:
+                        data = {"message": text}
+                    if not isinstance(data, dict):
+                        data = {"message": str(data)}
+                    # Barge-in: anything the client sends cancels the reply in progress
+                    if current["cancel_event"] is not None:
+                        current["cancel_event"].set()
+                    if data.get("type") != "cancel" and (data.get("message") or "").strip():
+                        await messages.put(data["message"].strip())
+            except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+                pass
+            finally:
+                if current["cancel_event"] is not None:
+                    current["cancel_event"].set()
+                await messages.put(None)
+
+        reader_task = asyncio.create_task(read_messages())
+        try:
+            while (message := await messages.get()) is not None:
+                current["cancel_event"] = cancel_event = threading.Event()
+                started_at = time.perf_counter()
+                try:
+                    reply = await self.stream_turn(
+                        session, message, lambda sentence: send({"type": "sentence", "text": sentence}), cancel_event
+                    )
+                    await send({
+                        "type": "done", "reply": reply, "cancelled": cancel_event.is_set(),
+                        "seconds": time.perf_counter() - started_at,
+                    })
+                except ServerBusy:
+                    await send({"type": "error", "error": "server busy, retry later"})
+                except SessionClosed:
+                    await send({"type": "error", "error": "session closed"})
+                    break
+                current["cancel_event"] = None
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            reader_task.cancel()
+
+
+def _delete_memory_files(memory_file: str):
+    """Deletes a memory namespace's SQLite database (with its WAL files) and any legacy JSON file."""
+    db_file = os.path.splitext(memory_file)[0] + ".db"
+    for path in (memory_file, db_file, db_file + "-wal", db_file + "-shm"):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+# --- WIRE FORMAT HELPERS ---
+
+def _check_user_token(user: str, token: str):
+    """
+    Checks token against the one issued for user (only its hash is kept, in
+    SESSION_MEMORY_DIR/<user>.token). If user has none yet, issues and returns
+    a new token; returns None if token is valid, raises AccessDenied otherwise.
+    """
+    token_file = os.path.join(SESSION_MEMORY_DIR, f"{user}.token")
+    try:
+        # O_EXCL: if two clients claim the same new user at once, only one wins
+        fd = os.open(token_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(token_file) as f:
+            expected = f.read().strip()
+        given = hashlib.sha256((token or "").encode()).hexdigest()
+        if not token or not secrets.compare_digest(given, expected):
+            raise AccessDenied(user)
+        return None
+    new_token = secrets.token_urlsafe(24)
+    with os.fdopen(fd, "w") as f:
+        f.write(hashlib.sha256(new_token.encode()).hexdigest())
+    return new_token
+
+
+async def _read_request(reader):
+    """Reads one HTTP/1.1 request, or returns None when the client closed the connection."""
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+    try:
+        method, target, _ = request_line.decode("latin-1").split()
+    except ValueError:
+        raise ValueError("malformed request line")
+
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get("content-length") or 0)
+    if length > MAX_BODY_BYTES:
+        raise ValueError("request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return Request(method, target, headers, body)
+
+
+async def _send_json(writer, status: int, payload: dict, keep_alive: bool = True) -> bool:
+    body = json.dumps(payload).encode()
+    writer.write(
+        f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode()
+        + body
+    )
+    await writer.drain()
+    return keep_alive
+
+
+async def _read_websocket_message(reader):
+    """Reads one WebSocket message (joining fragments). Returns (opcode, payload)."""
+    message_opcode, parts = None, []
+    while True:
+        first, second = await reader.readexactly(2)
+        fin, opcode = first & 0x80, first & 0x0F
+        length = second & 0x7F
+        if length == 126:
+            length = struct.unpack("!H", await reader.readexactly(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", await reader.readexactly(8))[0]
+        if length > MAX_BODY_BYTES:
+            raise ValueError("WebSocket message too large")
+        mask = await reader.readexactly(4) if second & 0x80 else bytes(4)
+        payload = bytes(byte ^ mask[i % 4] for i, byte in enumerate(await reader.readexactly(length)))
+
+        if opcode >= 0x8:
+            return opcode, payload  # Control frames are never fragmented
+        if opcode != 0x0:
+            message_opcode = opcode
+        parts.append(payload)
+        if fin:
+            return message_opcode, b"".join(parts)
+
+
+def _websocket_frame(opcode: int, payload: bytes) -> bytes:
+    """One unmasked, unfragmented server-to-client frame."""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, length)
+    elif length < 1 << 16:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+    return header + payload
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve SPARQL.AI to many clients over HTTP and WebSocket")
+    parser.add_argument("--host", default="127.0.0.1", help="interface to listen on; keep it loopback unless behind a TLS proxy")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--base-url", default=OLLAMA_BASE_URL, help="OpenAI-compatible model server")
+    parser.add_argument(
+        "--max-concurrent", type=int, default=MAX_CONCURRENT_REQUESTS,
+        help="requests sent to the model server at once (match OLLAMA_NUM_PARALLEL)",
+    )
+    parser.add_argument("--max-pending", type=int, default=MAX_PENDING_TURNS, help="turns admitted before answering 503")
+    parser.add_argument("--trace", nargs="?", const=DEFAULT_TRACE_FILE, metavar="FILE", help="write per-turn traces as JSONL")
+    args = parser.parse_args()
+
+    if args.trace:
+        tracer.configure(args.trace)
+
+    brain = CoreBrain(base_url=args.base_url, max_concurrent_requests=args.max_concurrent)
+    brain.warm_up()
+    try:
+        asyncio.run(SparqlServer(brain, max_pending=args.max_pending).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        brain.router.print_stats()
@@ -0,0 +1,95 @@
+import argparse
+import subprocess
+import sys
+from collections import defaultdict
+
+# Heavy dependencies that must stay off the startup path: they are imported on
+# first use or by background threads (see core_brain.py, tools.py, voice_interface.py).
+DEFERRED_IMPORTS = ["openai", "httpx", "speech_recognition", "pyttsx3", "pyaudio", "googlesearch"]
+
+
+def _import_times(module: str) -> dict:
+    """
+    Imports module in a fresh interpreter with -X importtime.
+    Returns {module name: (self_us, cumulative_us)} for everything it imported.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Could not import {module}:\n{result.stderr.strip().splitlines()[-1]}")
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def measure_imports(module: str = "sparql_core.main", runs: int = 3) -> dict:
+    """Best of `runs` cold imports: {"total_ms", "modules", "packages", "eager_deferred"}."""
+    fastest = min((_import_times(module) for _ in range(runs)), key=lambda times: times[module][1])
+
+    packages = defaultdict(int)
+    for name, (self_us, _) in fastest.items():
+        packages[name.split(".")[0]] += self_us
+
+    return {
+        "total_ms": fastest[module][1] / 1000,
+        "modules": {name: self_us / 1000 for name, (self_us, _) in fastest.items()},
+        "packages": {name: us / 1000 for name, us in packages.items()},
+        # Deferred dependencies that were imported anyway: a startup regression
+        "eager_deferred": [name for name in DEFERRED_IMPORTS if name in fastest],
+    }
+
+
+def measure_deferred() -> dict:
+    """Import cost of each deferred dependency on its own (what lazy loading saves), or None if missing."""
+    costs = {}
+    for name in DEFERRED_IMPORTS:
+        try:
+            costs[name] = _import_times(name)[name][1] / 1000
+        except RuntimeError:
+            costs[name] = None
+    return costs
+
+
+def print_report(module: str = "sparql_core.main", runs: int = 3, top: int = 15) -> dict:
+    report = measure_imports(module, runs)
+    print(f"[Startup] import {module}: {report['total_ms']:.1f} ms (best of {runs})")
+
+    print(f"\n{'package':<32}{'ms':>10}")
+    for name, ms in sorted(report["packages"].items(), key=lambda item: -item[1])[:top]:
+        print(f"{name:<32}{ms:>10.1f}")
+
+    print(f"\n{'module (self time)':<48}{'ms':>10}")
+    for name, ms in sorted(report["modules"].items(), key=lambda item: -item[1])[:top]:
+        print(f"{name:<48}{ms:>10.1f}")
+
+    print(f"\n{'deferred dependency':<32}{'ms':>14}  loaded at startup?")
+    for name, ms in measure_deferred().items():
+        cost = "not installed" if ms is None else f"{ms:.1f}"
+        print(f"{name:<32}{cost:>14}  {'YES' if name in report['eager_deferred'] else 'no'}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure SPARQL.AI's import-time startup cost, per module")
+    parser.add_argument("--module", default="sparql_core.main", help="module to import (default: sparql_core.main)")
+    parser.add_argument("--runs", type=int, default=3, help="cold imports to take the best of")
+    parser.add_argument("--top", type=int, default=15, help="rows to show per table")
+    parser.add_argument(
+        "--budget-ms", type=float,
+        help="exit with status 1 if the import takes longer than this or loads a deferred dependency",
+    )
+    args = parser.parse_args()
+
+    report = print_report(args.module, args.runs, args.top)
+    if args.budget_ms is not None:
+        if report["total_ms"] > args.budget_ms or report["eager_deferred"]:
+            print(f"\n[Startup] FAILED: {report['total_ms']:.1f} ms (budget {args.budget_ms:.0f} ms), "
+                  f"eagerly imported: {report['eager_deferred'] or 'none'}")
+            sys.exit(1)
+        print(f"\n[Startup] OK: within the {args.budget_ms:.0f} ms budget")
@@ -0,0 +1,101 @@
+import re
+from types import SimpleNamespace
+
+# A sentence ends at . ! or ? (optionally followed by closing quotes/brackets)
+# and is followed by whitespace. Newlines also end a chunk.
+SENTENCE_END = re.compile(r'([.!?]+["\')\]]*)\s+|\n+')
+
+# Short words that end in a period but don't end a sentence.
+ABBREVIATIONS = {"mr", "mrs", "ms", "dr", "st", "vs", "etc", "e.g", "i.e", "no", "jr", "sr"}
+
+
+class SentenceChunker:
+    """
+    Turns a stream of LLM tokens into speakable sentences.
+    Feed it tokens as they arrive; it hands back every sentence that is complete.
+    """
+
+    def __init__(self, min_chars: int = 12):
+        # Very short fragments ("Ok.") are merged with the next sentence so the
+        # TTS engine isn't started for a single word.
+        self.min_chars = min_chars
+        self.buffer = ""
+
+    def feed(self, token: str) -> list:
+        """Adds a token and returns the sentences completed by it (may be empty)."""
+        if not token:
+            return []
+        self.buffer += token
+
+        sentences = []
+        start = 0
+        for match in SENTENCE_END.finditer(self.buffer):
+            candidate = self.buffer[start:match.end()].strip()
+            if len(candidate) < self.min_chars or self._is_false_boundary(candidate):
+                continue
+            sentences.append(candidate)
+            start = match.end()
+
+        self.buffer = self.buffer[start:]
+        return sentences
+
+    def flush(self) -> list:
+        """Returns whatever is left once the stream has finished."""
+        rest = self.buffer.strip()
+        self.buffer = ""
+        return [rest] if rest else []
+
+    def _is_false_boundary(self, candidate: str) -> bool:
+        """Catches 'Dr. Smith' and similar abbreviations."""
+        if not candidate.endswith("."):
+            return False
+        last_word = candidate.rstrip(".").rsplit(" ", 1)[-1].lower()
+        return last_word in ABBREVIATIONS
+
+
+class ToolCallAccumulator:
+    """
+    Rebuilds complete tool calls from streamed deltas.
+    With stream=True the model sends each tool call in pieces: the id and name
+    arrive first and the JSON arguments arrive a few characters at a time.
+    """
+
+    def __init__(self):
+        self._calls = {}
+
+    def add(self, tool_call_deltas):
+        for delta in tool_call_deltas or []:
+            call = self._calls.setdefault(delta.index, {"id": "", "name": "", "arguments": ""})
+            if delta.id:
+                call["id"] = delta.id
+            if delta.function:
+                if delta.function.name:
+                    call["name"] += delta.function.name
+                if delta.function.arguments:
+                    call["arguments"] += delta.function.arguments
+
+    def __bool__(self):
+        return bool(self._calls)
+
+    def tool_calls(self) -> list:
+        """Returns the calls in the same shape call_tool() expects from the SDK."""
+        return [
+            SimpleNamespace(
+                id=call["id"],
+                type="function",
+                function=SimpleNamespace(name=call["name"], arguments=call["arguments"] or "{}"),
+            )
+            for _, call in sorted(self._calls.items())
+        ]
+
+
+def tool_calls_to_dicts(tool_calls) -> list:
+    """Converts tool calls into plain dicts so they can be stored in conversation_history."""
+    return [
+        {
+            "id": tool_call.id,
+            "type": "function",
+            "function": {"name": tool_call.function.name, "arguments": tool_call.function.arguments},
+        }
+        for tool_call in tool_calls
+    ]
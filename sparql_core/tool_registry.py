@@ -0,0 +1,188 @@
+import inspect
+import json
+import re
+import threading
+
+# JSON schema types for the annotations tool functions use
+JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean"}
+
+DEFAULT_RESULT_TOKENS = 300  # Tool results longer than this are cut down before they reach the history
+RECENT_TOOL_TURNS = 2        # Tools used this many turns back are offered again (for follow-ups)
+
+
+def count_text_tokens(text: str) -> int:
+    """Same ~4 characters per token estimate as context.count_tokens()."""
+    return len(text) // 4
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cuts text to about max_tokens, at a line or sentence boundary when there is one nearby."""
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    boundary = max(cut.rfind("\n"), cut.rfind(". "))
+    if boundary > max_chars // 2:
+        cut = cut[:boundary + 1]
+    return cut.rstrip() + f"\n[... {len(text) - len(cut)} more characters cut]"
+
+
+def _parse_docstring(func) -> tuple:
+    """Returns (description, {argument: description}) from a Google-style docstring."""
+    doc = inspect.getdoc(func) or ""
+    description, _, args_section = doc.partition("Args:")
+    arguments = {}
+    for line in args_section.splitlines():
+        match = re.match(r"\s*(\w+):\s*(.+)", line)
+        if match:
+            arguments[match.group(1)] = match.group(2).strip()
+    return " ".join(description.split()), arguments
+
+
+class Tool:
+    """One registered tool: the function, its JSON schema (built once) and how to run it."""
+
+    def __init__(self, func, description=None, keywords=None, always=False, timeout=None,
+                 max_result_tokens=DEFAULT_RESULT_TOKENS, summarize=None):
+        self.func = func
+        self.name = func.__name__
+        self.keywords = re.compile(keywords, re.I) if keywords else None
+        self.always = always
+        self.timeout = timeout
+        self.max_result_tokens = max_result_tokens
+        self.summarize = summarize
+
+        doc_description, arg_descriptions = _parse_docstring(func)
+        self.parameters = {}  # name -> (python type, required)
+        properties = {}
+        for param in inspect.signature(func).parameters.values():
+            param_type = param.annotation if param.annotation in JSON_TYPES else str
+            self.parameters[param.name] = (param_type, param.default is inspect.Parameter.empty)
+            properties[param.name] = {"type": JSON_TYPES[param_type]}
+            if param.name in arg_descriptions:
+                properties[param.name]["description"] = arg_descriptions[param.name]
+
+        schema_parameters = {"type": "object", "properties": properties}
+        required = [name for name, (_, is_required) in self.parameters.items() if is_required]
+        if required:
+            schema_parameters["required"] = required
+        self.schema = {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": description or doc_description,
+                "parameters": schema_parameters,
+            },
+        }
+
+    def validate(self, arguments: dict) -> dict:
+        """Checks the model's arguments against the signature. Returns the kwargs or raises ValueError."""
+        kwargs = {}
+        for name, (param_type, required) in self.parameters.items():
+            if arguments.get(name) is None:
+                if required:
+                    raise ValueError(f"missing required argument '{name}'")
+                continue
+            value = arguments[name]
+            if param_type is str and not isinstance(value, str):
+                value = json.dumps(value) if isinstance(value, (dict, list)) else str(value)
+            elif param_type is not str and not isinstance(value, param_type):
+                try:
+                    value = param_type(value)
+                except (TypeError, ValueError):
+                    raise ValueError(f"argument '{name}' should be {JSON_TYPES[param_type]}, got {value!r}")
+            kwargs[name] = value
+        return kwargs
+
+    def fit_result(self, result: str) -> str:
+        """Shrinks an oversized result to max_result_tokens: the tool's summarizer first, then truncation."""
+        if self.max_result_tokens is None or count_text_tokens(result) <= self.max_result_tokens:
+            return result
+        if self.summarize is not None:
+            result = self.summarize(result)
+        return truncate_to_tokens(result, self.max_result_tokens)
+
+
+class ToolRegistry:
+    """
+    Tools are registered with a decorator; the JSON schema the model sees is built
+    from the function's signature and docstring (Args: section), once.
+
+        @registry.tool(keywords=r"\\bweather\\b")
+        def get_weather(city: str) -> str:
+            \"\"\"Returns the weather.
+
+            Args:
+                city: The city name.
+            \"\"\"
+
+    keywords is a regex; when one matches the user's message, select() offers the
+    model only the matching tools (plus always=True tools and tools used in the
+    last few turns), so every new tool doesn't make every request bigger. When no
+    keywords match, the message isn't understood well enough to narrow the list,
+    and every tool is offered.
+    """
+
+    def __init__(self):
+        self.tools = {}
+        self._schema_cache = {}
+        self._lock = threading.Lock()
+
+    def tool(self, description: str = None, keywords: str = None, always: bool = False, timeout: float = None,
+             max_result_tokens: int = DEFAULT_RESULT_TOKENS, summarize=None):
+        def register(func):
+            self.tools[func.__name__] = Tool(func, description, keywords, always, timeout, max_result_tokens, summarize)
+            self._schema_cache.clear()
+            return func
+        return register
+
+    def get(self, name: str):
+        return self.tools.get(name)
+
+    def schemas(self, names=None) -> list:
+        """The schemas for names (default: every tool), in registration order. Cached per set of names."""
+        key = tuple(name for name in self.tools if names is None or name in names)
+        with self._lock:
+            if key not in self._schema_cache:
+                self._schema_cache[key] = [self.tools[name].schema for name in key]
+            return self._schema_cache[key]
+
+    def select(self, user_input: str, conversation_history: list = None) -> list:
+        """Schemas of the tools relevant to this message; all of them if no keywords match."""
+        names = {
+            name for name, tool in self.tools.items()
+            if tool.keywords is not None and tool.keywords.search(user_input)
+        }
+        if not names:
+            return self.schemas()
+        names.update(name for name, tool in self.tools.items() if tool.always)
+        names.update(_recently_used_tools(conversation_history or [], RECENT_TOOL_TURNS))
+        return self.schemas(names)
+
+    def call(self, name: str, arguments_json: str) -> str:
+        """Validates the arguments, runs the tool and fits the result to its token budget."""
+        tool = self.tools.get(name)
+        if tool is None:
+            return f"Error: Tool '{name}' not found."
+        try:
+            arguments = json.loads(arguments_json or "{}")
+            if not isinstance(arguments, dict):
+                raise ValueError("arguments must be a JSON object")
+            kwargs = tool.validate(arguments)
+        except ValueError as e:
+            return f"Error: Invalid arguments for tool '{name}': {e}"
+        return tool.fit_result(str(tool.func(**kwargs)))
+
+
+def _recently_used_tools(conversation_history: list, turns: int) -> set:
+    """Names of the tools called in the last `turns` user turns (the current one excluded)."""
+    used = set()
+    seen_turns = 0
+    for message in reversed(conversation_history[:-1] if conversation_history else []):
+        if message["role"] == "user":
+            seen_turns += 1
+            if seen_turns >= turns:
+                break
+        for tool_call in message.get("tool_calls") or []:
+            used.add(tool_call["function"]["name"])
+    return used
@@ -1,17 +1,35 @@
-import json
+import contextvars
 import datetime
-from .memory import MemoryManager
-from googlesearch import search  # <-- Make sure this is imported
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from .memory import get_memory_manager
+from .search_cache import SearchCache
+from .tool_registry import ToolRegistry
+from .tracing import tracer
 
-# Initialize the memory manager
-memory = MemoryManager()
+# Every tool registers itself here; its JSON schema is built from its signature and docstring
+registry = ToolRegistry()
+
+# Recent search results, kept in memory and in search_cache.db across restarts
+search_cache = SearchCache(cache_file="search_cache.db")
+
+# How long each tool may run (seconds) before its call is abandoned; tools can set their own
+DEFAULT_TOOL_TIMEOUT = 3.0
+SEARCH_REQUEST_TIMEOUT = 5
+TOOL_QUEUE_TIMEOUT = 10.0  # A call still waiting for a free worker after this long is dropped
+TOOL_WORKERS = 4           # Tool calls running at once (server and batch mode raise it, see set_tool_workers)
 
 # --- EXISTING TOOLS ---
 
+@registry.tool(keywords=r"\b(time|date|day|today|tonight|tomorrow|yesterday|clock|hours?|minutes?|week|month|year|now)\b")
 def get_current_time() -> str:
     """Returns the current date and time."""
     return datetime.datetime.now().isoformat()
 
+@registry.tool(
+    description="Saves a fact to the user's long-term memory. Use this when the user says 'remember my name is...' or 'my favorite color is...'",
+    keywords=r"\b(remember|memori[sz]e|note|save|forget|call me)\b|\bmy \w+(?:['’]s)?(?: \w+)? (?:is|are)\b|\bi (?:like|love|prefer|hate)\b",
+)
 def save_to_memory(key: str, value: str) -> str:
     """
     Saves a piece of information to the user's long-term memory.
@@ -20,132 +38,164 @@ def save_to_memory(key: str, value: str) -> str:
         key: The category or name of the fact (e.g., "user_name", "favorite_food").
         value: The information to save (e.g., "Rahul", "Pizza").
     """
-    memory.save(key, value)
+    # The same memory store the brain uses, opened on first use
+    get_memory_manager().save(key, value)
     return f"Successfully saved {key} = {value} to long-term memory."
 
+@registry.tool(
+    description="Loads a specific fact from the user's long-term memory. Use this when the user asks 'what is my name?'",
+    keywords=r"\b(my|me|mine|recall|remember|do you know)\b",
+)
 def load_from_memory(key: str) -> str:
     """
     Retrieves a piece of information from the user's long-term memory.
+    The key doesn't have to match exactly ("favourite food" finds "favorite_food").
     
     Args:
         key: The category or name of the fact to retrieve.
     """
-    value = memory.load(key)
+    memory = get_memory_manager()
+    matched_key = memory.find_key(key)
+    value = memory.load(matched_key) if matched_key else None
     if value:
-        return f"Retrieved {key} = {value} from long-term memory."
+        return f"Retrieved {matched_key} = {value} from long-term memory."
     return f"No value found for {key} in memory."
 
 # --- NEW TOOL ---
 
+def _search_google(query: str) -> str:
+    """Sends the query to Google and formats the top 3 results. Raises on network errors."""
+    from googlesearch import search  # Imported on the first search, not at startup
+    
+    print(f"[Tool Action: Searching Google for '{query}']")
+    # Get the first 3 results
+    results = []
+    # The search() function is a generator, so we loop 3 times
+    for result in search(query, num_results=3, advanced=True, timeout=SEARCH_REQUEST_TIMEOUT):
+        results.append(f"Title: {result.title}\nDescription: {result.description}\nURL: {result.url}\n")
+    
+    if not results:
+        return "No search results found."
+        
+    return "\n".join(results)
+
+# The function that actually runs a search; benchmarks swap in an offline one
+search_backend = _search_google
+
+def _summarize_search_results(results: str) -> str:
+    """Keeps each result's title and the first sentence of its description; URLs aren't needed for a spoken answer."""
+    lines = []
+    for line in results.splitlines():
+        if line.startswith("Description:"):
+            line = line.split(". ")[0].rstrip(".") + "."
+        if line.strip() and not line.startswith("URL:"):
+            lines.append(line)
+    return "\n".join(lines)
+
+@registry.tool(
+    description="Performs a Google search for a given query. Use this to find real-time information, weather, news, facts, or anything you don't know.",
+    # Real-time questions are too varied to spot with keywords ("is it going to rain?"),
+    # so search is offered on every turn
+    always=True,
+    timeout=8.0,
+    summarize=_summarize_search_results,
+)
 def google_search(query: str) -> str:
     """
     Performs a Google search for the given query and returns the top 3 results.
     Use this for any questions about current events, facts, or real-time information.
+    Results are cached (see search_cache.py), so repeating a question is instant.
     
     Args:
-        query: The string to search for on Google (e.g., 'weather in Ghaziabad').
+        query: The search query (e.g., 'weather in Ghaziabad', 'latest tech news').
     """
-    print(f"[Tool Action: Searching Google for '{query}']")
     try:
-        # Get the first 3 results
-        results = []
-        # The search() function is a generator, so we loop 3 times
-        for result in search(query, num_results=3, advanced=True):
-            results.append(f"Title: {result.title}\nDescription: {result.description}\nURL: {result.url}\n")
-        
-        if not results:
-            return "No search results found."
-            
-        return "\n".join(results)
+        return search_cache.get_or_fetch(query, search_backend)
     
     except Exception as e:
         print(f"[Search Error]: {e}")
         return f"An error occurred during the search: {e}"
 
-# --- UPDATED MANIFEST AND DICTIONARY ---
-
-# This "manifest" tells the AI which tools it has
-TOOL_MANIFEST = [
-    {
-        "type": "function",
-        "function": {
-            "name": "get_current_time",
-            "description": "Returns the current date and time.",
-            "parameters": {"type": "object", "properties": {}},
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "save_to_memory",
-            "description": "Saves a fact to the user's long-term memory. Use this when the user says 'remember my name is...' or 'my favorite color is...'",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "key": {"type": "string", "description": "The key or category of the fact to save."},
-                    "value": {"type": "string", "description": "The value of the fact to save."},
-                },
-                "required": ["key", "value"],
-            },
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "load_from_memory",
-            "description": "Loads a specific fact from the user's long-term memory. Use this when the user asks 'what is my name?'",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "key": {"type": "string", "description": "The key or category of the fact to load."},
-                },
-                "required": ["key"],
-            },
-        },
-    },
-    # --- ADDING THE NEW TOOL TO THE MANIFEST ---
-    {
-        "type": "function",
-        "function": {
-            "name": "google_search",
-            "description": "Performs a Google search for a given query. Use this to find real-time information, weather, news, facts, or anything you don't know.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "query": {"type": "string", "description": "The search query (e.g., 'weather in Ghaziabad', 'latest tech news')."},
-                },
-                "required": ["query"],
-            },
-        },
-    },
-]
+# --- MANIFEST AND DISPATCH ---
+
+# Schemas for every tool (built once by the registry); CoreBrain sends only the
+# relevant ones each turn, see registry.select()
+TOOL_MANIFEST = registry.schemas()
 
 # This dictionary maps tool names to their actual Python functions
-AVAILABLE_TOOLS = {
-    "get_current_time": get_current_time,
-    "save_to_memory": save_to_memory,
-    "load_from_memory": load_from_memory,
-    "google_search": google_search  # <-- ADDING THE NEW TOOL HERE
-}
+AVAILABLE_TOOLS = {name: tool.func for name, tool in registry.tools.items()}
+
+# Shared, bounded pool for running a turn's tool calls in parallel
+_tool_executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="sparql-tool")
+
+def set_tool_workers(max_workers: int):
+    """
+    Replaces the tool pool with one of max_workers threads. Call it before any
+    turns run; server and batch mode size it to the turns they run at once.
+    """
+    global _tool_executor
+    old_executor = _tool_executor
+    _tool_executor = ThreadPoolExecutor(max_workers=max(max_workers, TOOL_WORKERS), thread_name_prefix="sparql-tool")
+    old_executor.shutdown(wait=False)
 
 def call_tool(tool_call):
-    """Executes a tool call requested by the AI."""
-    func_name = tool_call.function.name
-    func_args = json.loads(tool_call.function.arguments)
-    
-    if func_name in AVAILABLE_TOOLS:
-        function_to_call = AVAILABLE_TOOLS[func_name]
-        
-        # This logic routes the arguments to the correct function
-        if func_name == "save_to_memory":
-            result = function_to_call(key=func_args.get("key"), value=func_args.get("value"))
-        elif func_name == "load_from_memory":
-            result = function_to_call(key=func_args.get("key"))
-        elif func_name == "google_search":
-            result = function_to_call(query=func_args.get("query"))
-        else: # For get_current_time
-            result = function_to_call() 
-            
-        return result
-    else:
-        return f"Error: Tool '{func_name}' not found."
\ No newline at end of file
+    """
+    Executes a tool call requested by the AI: the arguments are checked against
+    the tool's signature, and an oversized result is cut down to the tool's
+    token budget before it goes into the conversation history.
+    """
+    return registry.call(tool_call.function.name, tool_call.function.arguments)
+
+def _timed_call(tool_call, started: Future):
+    """Runs one tool call on a worker thread and measures how long it took."""
+    started_at = time.perf_counter()
+    started.set_result(started_at)
+    with tracer.span("tool", tool=tool_call.function.name) as span:
+        try:
+            result = call_tool(tool_call)
+        except Exception as e:
+            print(f"[Tool Error]: {tool_call.function.name}: {e}")
+            result = f"Error: Tool '{tool_call.function.name}' failed: {e}"
+            span["error"] = str(e)
+    return result, time.perf_counter() - started_at
+
+def call_tools(tool_calls) -> list:
+    """
+    Executes all tool calls from one AI response in parallel.
+    Each tool gets its own time limit (its registered timeout), counted from when
+    it starts running, so time spent queued behind other sessions' tools doesn't
+    count. A tool that runs over is abandoned, one that can't get a worker within
+    TOOL_QUEUE_TIMEOUT is cancelled, and the AI gets an error message instead.
+    Returns a list of (tool_call, result, seconds) in the original call order.
+    """
+    dispatched_at = time.perf_counter()
+    futures = []
+    for tool_call in tool_calls:
+        started = Future()  # Resolved with the start time when a worker picks the call up
+        # Each call runs in a copy of the caller's context, so its trace span joins the current turn
+        future = _tool_executor.submit(contextvars.copy_context().run, _timed_call, tool_call, started)
+        futures.append((tool_call, started, future))
+
+    results = []
+    for tool_call, started, future in futures:
+        func_name = tool_call.function.name
+        tool = registry.get(func_name)
+        time_limit = (tool.timeout if tool else None) or DEFAULT_TOOL_TIMEOUT
+        try:
+            started_at = started.result(timeout=max(TOOL_QUEUE_TIMEOUT - (time.perf_counter() - dispatched_at), 0))
+        except FutureTimeoutError:
+            if future.cancel():
+                print(f"[Tool Timeout]: {func_name} waited {TOOL_QUEUE_TIMEOUT:.0f}s for a free worker")
+                result = f"Error: Tool '{func_name}' could not run: too many tools are running."
+                results.append((tool_call, result, time.perf_counter() - dispatched_at))
+                continue
+            # A worker picked the call up just as the queue wait ran out: it still gets its full time limit
+            started_at = started.result()
+        try:
+            result, seconds = future.result(timeout=max(time_limit - (time.perf_counter() - started_at), 0))
+        except FutureTimeoutError:
+            seconds = time.perf_counter() - started_at
+            result = f"Error: Tool '{func_name}' timed out after {time_limit:.0f} seconds."
+            print(f"[Tool Timeout]: {func_name} did not finish within {time_limit:.0f}s")
+        results.append((tool_call, result, seconds))
+    return results
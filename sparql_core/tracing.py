@@ -0,0 +1,176 @@
+import argparse
+import contextlib
+import contextvars
+import itertools
+import json
+import threading
+import time
+from collections import defaultdict
+
+DEFAULT_TRACE_FILE = "sparql_trace.jsonl"
+
+# The turn being traced in this thread/task. Tool threads and asyncio.to_thread
+# copy the context, so their spans land in the right turn.
+_current_turn = contextvars.ContextVar("sparql_current_turn", default=None)
+
+
+class Turn:
+    """Timing record for one user turn: one entry per stage (span), plus totals."""
+
+    def __init__(self, turn_id: int, **attrs):
+        self.record = {
+            "turn_id": turn_id,
+            "started_at": time.time(),
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "tools": [],
+            "stages": [],
+            **attrs,
+        }
+        self.discarded = False
+        self._lock = threading.Lock()
+
+    def add_span(self, span: dict):
+        with self._lock:
+            self.record["stages"].append(span)
+            self.record["prompt_tokens"] += span.get("prompt_tokens") or 0
+            self.record["completion_tokens"] += span.get("completion_tokens") or 0
+            if span.get("tool"):
+                self.record["tools"].append(span["tool"])
+
+    def annotate(self, **attrs):
+        with self._lock:
+            self.record.update(attrs)
+
+    def discard(self):
+        """Don't write this turn (e.g. the microphone heard nothing)."""
+        self.discarded = True
+
+
+class Tracer:
+    """
+    Lightweight per-turn latency tracing.
+
+        with tracer.turn():
+            with tracer.span("asr"):
+                ...
+
+    Spans outside a turn are timed but not recorded. Finished turns are
+    appended to trace_file as one JSON object per line; nothing is written
+    until configure() has been called.
+    """
+
+    def __init__(self):
+        self.trace_file = None
+        self._file = None
+        self._lock = threading.Lock()
+        self._turn_ids = itertools.count(1)
+
+    def configure(self, trace_file: str = DEFAULT_TRACE_FILE):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+            self.trace_file = trace_file
+            self._file = open(trace_file, "a", encoding="utf-8") if trace_file else None
+
+    def current_turn(self):
+        return _current_turn.get()
+
+    @contextlib.contextmanager
+    def turn(self, **attrs):
+        turn = Turn(next(self._turn_ids), **attrs)
+        token = _current_turn.set(turn)
+        started_at = time.perf_counter()
+        try:
+            yield turn
+        finally:
+            _current_turn.reset(token)
+            turn.record["seconds"] = time.perf_counter() - started_at
+            if not turn.discarded:
+                self._write(turn.record)
+
+    @contextlib.contextmanager
+    def span(self, stage: str, turn=None, **attrs):
+        """
+        Times one stage. The yielded dict can be filled with extra fields
+        (token counts, tool name...). turn defaults to the current one; pass it
+        explicitly for work handed to another thread, like TTS playback.
+        """
+        turn = turn or _current_turn.get()
+        span = {"stage": stage, **attrs}
+        started_at = time.perf_counter()
+        try:
+            yield span
+        finally:
+            span["seconds"] = time.perf_counter() - started_at
+            if turn is not None:
+                turn.add_span(span)
+
+    def annotate(self, **attrs):
+        """Adds fields to the current turn's record."""
+        turn = _current_turn.get()
+        if turn is not None:
+            turn.annotate(**attrs)
+
+    def _write(self, record: dict):
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(json.dumps(record, default=str) + "\n")
+            self._file.flush()
+
+
+# The tracer every module reports to
+tracer = Tracer()
+
+
+# --- SUMMARIZER ---
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(trace_file: str = DEFAULT_TRACE_FILE) -> dict:
+    """Returns {stage: {"count", "p50", "p95", "p99"}} in seconds, read from a trace file."""
+    durations = defaultdict(list)
+    with open(trace_file, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            durations["turn"].append(record["seconds"])
+            for span in record["stages"]:
+                stage = f"tool:{span['tool']}" if span.get("tool") else span["stage"]
+                durations[stage].append(span["seconds"])
+
+    summary = {}
+    for stage, values in durations.items():
+        values.sort()
+        summary[stage] = {
+            "count": len(values),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+        }
+    return summary
+
+
+def print_summary(trace_file: str = DEFAULT_TRACE_FILE):
+    summary = summarize(trace_file)
+    print(f"{'stage':<28}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, stats in sorted(summary.items(), key=lambda item: -item[1]["p50"]):
+        print(
+            f"{stage:<28}{stats['count']:>7}{stats['p50'] * 1000:>10.1f}"
+            f"{stats['p95'] * 1000:>10.1f}{stats['p99'] * 1000:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize SPARQL.AI latency traces")
+    parser.add_argument("trace_file", nargs="?", default=DEFAULT_TRACE_FILE)
+    args = parser.parse_args()
+    print_summary(args.trace_file)
@@ -1,65 +1,244 @@
-import speech_recognition as sr
-import pyttsx3
+import array
+import collections
+import math
+import queue
+import threading
+import time
+from .tracing import tracer
+
+# --- VOICE ACTIVITY DETECTION (VAD) SETTINGS ---
+MIN_SPEECH_ENERGY = 300       # Never treat anything quieter than this as speech (the old fixed threshold)
+SPEECH_TO_NOISE_RATIO = 2.5   # Speech must be this many times louder than the background noise
+ECHO_RATIO = 2.0              # ...and this much louder again while the assistant itself is talking
+NOISE_FLOOR_ADAPT_RATE = 0.05 # How quickly the noise floor follows changes in background noise
+SPEECH_START_SECONDS = 0.1    # Loud audio must last this long to count as the start of speech
+END_OF_SPEECH_SECONDS = 0.8   # This much silence ends an utterance
+PRE_ROLL_SECONDS = 0.3        # Audio kept from just before speech started, so first syllables aren't cut
+MAX_UTTERANCE_SECONDS = 30    # Safety cap in case the room never goes quiet
+LISTEN_POLL_SECONDS = 5       # listen_for_command() returns None after this long without an utterance
+
+
+def frame_energy(frame: bytes) -> float:
+    """RMS energy of a chunk of 16-bit audio (same scale as the recognizer's energy_threshold)."""
+    samples = array.array('h', frame)
+    if not samples:
+        return 0.0
+    return math.sqrt(sum(sample * sample for sample in samples) / len(samples))
+
 
 class VoiceInterface:
+    """
+    Microphone in, speech out. speech_recognition, PyAudio and pyttsx3 are
+    imported by the capture and TTS threads, so constructing this returns
+    straight away and the audio stack loads while the first listen begins.
+    """
+
     def __init__(self):
-        # Initialize the recognizer
-        self.recognizer = sr.Recognizer()
-        
-        # --- CHANGE 1: REMOVED THE TTS INIT ---
-        # We will now initialize it inside the speak() function
-        # self.tts_engine = pyttsx3.init() 
-        
-        # We will manually set the energy threshold instead of dynamic
-        self.recognizer.dynamic_energy_threshold = False
-        self.recognizer.energy_threshold = 300  # We'll keep this sensitive setting
+        # The recognizer is created by the capture thread, before it hands over any audio
+        self.recognizer = None
+
+        # Called (from the capture thread) as soon as the user starts talking; used for barge-in
+        self.on_speech_start = None
+
+        # --- LISTENING: one microphone stream for the whole session ---
+        # A background thread keeps reading the microphone, tracks the noise floor
+        # and cuts the audio into utterances, which wait here to be recognized.
+        self._utterance_audio = queue.Queue()
+        self.noise_floor = None
+        self._announce_listening = True
+
+        # --- SPEAKING: one TTS engine, owned by one long-lived worker thread ---
+        # Creating the engine once and only ever touching it from this thread is
+        # what fixes the old "only speaks once" problem.
+        self._speech_queue = queue.Queue()
+        self._tts_engine = None
+        self._stop_requested = threading.Event()
+        self._is_speaking = False
+        self._speech_worker = threading.Thread(target=self._speech_loop, daemon=True)
+        self._speech_worker.start()
+
+        # Start listening last: the capture thread checks _is_speaking
+        self._capture_thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self._capture_thread.start()
 
     def listen_for_command(self) -> str:
         """
-        Listens for audio from the microphone and returns it as text.
-        Returns None if there is an error.
+        Waits for the next utterance from the microphone and returns it as text.
+        Returns None if nothing was said or there is an error.
         """
+        import speech_recognition as sr  # Already loaded by the capture thread; this is just a lookup
+        
         text = None
         try:
-            # We are using the system's default mic (no device_index)
-            with sr.Microphone() as source:
-            
-                # Listen for a second to get a good noise baseline
-                self.recognizer.adjust_for_ambient_noise(source, duration=1) 
+            if self._announce_listening:
                 print("Listening... (speak now)")
-                
-                # Listen for audio
-                audio = self.recognizer.listen(source, timeout=7, phrase_time_limit=10)
-                
-                # Recognize speech using Google's ONLINE recognizer
-                print("Recognizing...")
-                # --- CHANGE 2: ADD LANGUAGE HINT (see notes below) ---
-                # Let's add English (India) and Hindi as options for Google to check
+                self._announce_listening = False
+
+            # The capture thread has already found where the utterance starts and ends
+            audio = self._utterance_audio.get(timeout=LISTEN_POLL_SECONDS)
+            self._announce_listening = True
+
+            # Recognize speech using Google's ONLINE recognizer
+            print("Recognizing...")
+            # Let's add English (India) as the language hint for Google
+            with tracer.span("asr"):
                 text = self.recognizer.recognize_google(audio, language="en-IN")
-        
+
+        except queue.Empty:
+            pass
         except sr.UnknownValueError:
             print("Speech Recognition could not understand audio")
         except sr.RequestError as e:
             print(f"Google Speech Recognition request failed; {e}")
-        except sr.WaitTimeoutError:
-            print("Listening timed out... please speak sooner.")
         except Exception as e:
             print(f"An unexpected error occurred during listening: {e}")
-            
+
         return text
 
+    def _capture_loop(self):
+        """Keeps the microphone open and reconnects if the stream fails."""
+        import speech_recognition as sr
+        self.recognizer = sr.Recognizer()
+        
+        while True:
+            try:
+                # We are using the system's default mic (no device_index)
+                with sr.Microphone() as source:
+                    self._capture_utterances(source)
+            except Exception as e:
+                print(f"[ERROR] Microphone stream failed, reopening: {e}")
+                time.sleep(1)
+
+    def _capture_utterances(self, source):
+        """
+        Reads the microphone forever, splitting it into utterances with a simple
+        energy-based VAD. The noise floor is learned from the quiet parts, so
+        there is no per-turn calibration pause.
+        """
+        import speech_recognition as sr
+        
+        seconds_per_chunk = source.CHUNK / source.SAMPLE_RATE
+        start_chunks = max(1, int(SPEECH_START_SECONDS / seconds_per_chunk))
+        end_chunks = max(1, int(END_OF_SPEECH_SECONDS / seconds_per_chunk))
+        max_chunks = int(MAX_UTTERANCE_SECONDS / seconds_per_chunk)
+        pre_roll = collections.deque(maxlen=max(1, int(PRE_ROLL_SECONDS / seconds_per_chunk)))
+
+        frames = []  # Chunks of the utterance in progress (empty while nobody is talking)
+        loud_chunks = 0
+        quiet_chunks = 0
+        started_while_speaking = False
+
+        while True:
+            frame = source.stream.read(source.CHUNK)
+            energy = frame_energy(frame)
+            if self.noise_floor is None:
+                self.noise_floor = energy
+
+            threshold = max(MIN_SPEECH_ENERGY, self.noise_floor * SPEECH_TO_NOISE_RATIO)
+            if self._is_speaking:
+                threshold *= ECHO_RATIO
+            is_loud = energy > threshold
+
+            if not frames:
+                pre_roll.append(frame)
+                if not is_loud:
+                    # Background noise: let the noise floor follow it
+                    self.noise_floor += NOISE_FLOOR_ADAPT_RATE * (energy - self.noise_floor)
+                    loud_chunks = 0
+                    continue
+                loud_chunks += 1
+                if loud_chunks < start_chunks:
+                    continue
+                # Speech started
+                frames = list(pre_roll)
+                pre_roll.clear()
+                quiet_chunks = 0
+                started_while_speaking = self._assistant_talking()
+                if self.on_speech_start is not None:
+                    self.on_speech_start()
+                continue
+
+            frames.append(frame)
+            quiet_chunks = 0 if is_loud else quiet_chunks + 1
+            if quiet_chunks >= end_chunks or len(frames) >= max_chunks:
+                # Without a barge-in handler (the half-duplex loop) nobody is listening
+                # while the assistant talks, and what the microphone hears then is most
+                # likely the assistant's own voice, so it isn't kept for the next turn
+                if self.on_speech_start is not None or not started_while_speaking:
+                    self._utterance_audio.put(sr.AudioData(b"".join(frames), source.SAMPLE_RATE, source.SAMPLE_WIDTH))
+                frames = []
+                loud_chunks = 0
+
+    def _assistant_talking(self) -> bool:
+        """True while a sentence is being spoken or waiting to be (including the gaps between them)."""
+        return self._is_speaking or self._speech_queue.unfinished_tasks > 0
+
     def speak(self, text: str):
         """
-        Speaks the given text out loud.
+        Speaks the given text out loud and waits until it has been said
+        (or interrupted by stop_speaking()).
+        """
+        if text:
+            done = threading.Event()
+            self._speech_queue.put((text, done, tracer.current_turn()))
+            done.wait()
+
+    def speak_async(self, text: str):
+        """
+        Queues text to be spoken by the TTS worker and returns immediately.
+        Used for streamed replies, so the next sentence can be generated while
+        the current one is being spoken.
         """
         if text:
+            self._speech_queue.put((text, None, tracer.current_turn()))
+
+    def wait_until_spoken(self):
+        """Blocks until every queued sentence has been spoken."""
+        self._speech_queue.join()
+
+    def stop_speaking(self):
+        """Drops every queued sentence and cuts off the one being spoken (barge-in)."""
+        while True:
+            try:
+                _, done, _ = self._speech_queue.get_nowait()
+            except queue.Empty:
+                break
+            if done is not None:
+                done.set()
+            self._speech_queue.task_done()
+        if self._is_speaking:
+            # The engine is stopped from its own thread, in _on_word()
+            self._stop_requested.set()
+
+    def _speech_loop(self):
+        try:
+            import pyttsx3  # Imported (and the engine started) on this thread, off the startup path
+            self._tts_engine = pyttsx3.init()
+            self._tts_engine.connect('started-word', self._on_word)
+        except Exception as e:
+            print(f"[ERROR] Could not start the TTS engine: {e}")
+
+        while True:
+            text, done, turn = self._speech_queue.get()
+            self._stop_requested.clear()
+            self._is_speaking = True
             print(f"SPARQL.AI: {text}")
             try:
-                # --- CHANGE 3: INITIALIZE AND RUN TTS INSIDE THE FUNCTION ---
-                # This is the fix for the "only speaks once" problem.
-                tts_engine = pyttsx3.init()
-                tts_engine.say(text)
-                tts_engine.runAndWait()
-                tts_engine.stop() # Ensure it stops cleanly
+                # Playback happens on this thread, so the turn is passed along explicitly
+                with tracer.span("tts", turn=turn):
+                    if self._tts_engine is not None:
+                        self._tts_engine.say(text)
+                        self._tts_engine.runAndWait()
             except Exception as e:
-                print(f"[ERROR] Could not speak text: {e}")
\ No newline at end of file
+                print(f"[ERROR] Could not speak text: {e}")
+            finally:
+                self._is_speaking = False
+                if done is not None:
+                    done.set()
+                self._speech_queue.task_done()
+
+    def _on_word(self, name, location, length):
+        """pyttsx3 callback, runs on the TTS thread before each word."""
+        if self._stop_requested.is_set():
+            self._stop_requested.clear()
+            self._tts_engine.stop()
@@ -0,0 +1,17 @@
+import json
+
+from sparql_core.batch import read_finished
+
+
+def test_read_finished_skips_failed_and_cut_off_turns(tmp_path):
+    """Resuming reruns turns that failed, even if an earlier run had finished them."""
+    output_file = tmp_path / "results.jsonl"
+    records = [
+        {"id": "a", "reply": "hello"},
+        {"id": "b", "reply": "first try"},
+        {"id": "b", "error": "model server down"},
+        {"id": "c", "error": "timeout"},
+    ]
+    output_file.write_text("".join(json.dumps(record) + "\n" for record in records) + '{"id": "d", "rep')
+
+    assert sorted(read_finished(str(output_file))) == ["a"]
@@ -0,0 +1,17 @@
+from sparql_core.context import SUMMARY_HEADER, ContextWindow
+
+
+def test_current_turn_is_kept_with_keep_recent_turns_zero():
+    window = ContextWindow(max_tokens=50, keep_recent_turns=0)
+    history = []
+    for i in range(5):
+        history += [
+            {"role": "user", "content": f"question number {i} " * 5},
+            {"role": "assistant", "content": "a long answer " * 10},
+        ]
+    history.append({"role": "user", "content": "what time is it"})
+
+    window.fit(history)
+
+    assert history[0]["content"].startswith(SUMMARY_HEADER)
+    assert history[-1] == {"role": "user", "content": "what time is it"}
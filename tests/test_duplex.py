@@ -0,0 +1,42 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("openai")
+
+from benchmarks.stubs import StubChatServer
+from sparql_core.core_brain import CoreBrain
+from sparql_core.duplex import GOODBYE, DuplexRuntime
+from sparql_core.fake_audio import FakeMicrophone, FakeSpeaker
+
+REPLY_WORDS = 200
+
+
+def test_barge_in_cancels_reply_and_truncates_history(tmp_path, monkeypatch):
+    """Talking over a long reply stops playback and keeps only what was generated so far."""
+    monkeypatch.chdir(tmp_path)  # Long-term memory and the search cache go here
+
+    microphone = FakeMicrophone([
+        "tell me a long story",
+        (0.5, "what time is it"),  # Interrupts the story while it is being spoken
+        (1.0, "exit"),
+    ])
+    speaker = FakeSpeaker(words_per_second=20)
+
+    # 200 words at 10 ms per token: the reply is still streaming when the user talks over it
+    with StubChatServer(prefill_seconds=0.05, seconds_per_token=0.01, reply_words=REPLY_WORDS) as stub:
+        brain = CoreBrain(base_url=stub.base_url)
+        runtime = DuplexRuntime(brain, microphone, speaker)
+        asyncio.run(asyncio.wait_for(runtime.run(), timeout=30))
+
+    assert runtime.barge_ins == 1
+    assert speaker.interrupted, "the sentence playing at the barge-in should have been cut off"
+    assert speaker.spoken[-1] == GOODBYE
+
+    history = runtime.conversation_history
+    assert [message["role"] for message in history[:2]] == ["user", "assistant"]
+    assert history[0]["content"] == "tell me a long story"
+    story = history[1]["content"]
+    assert story and len(story.split()) < REPLY_WORDS
+    # The interrupting question was answered afterwards, in the same conversation
+    assert history[2] == {"role": "user", "content": "what time is it"}
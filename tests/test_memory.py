@@ -0,0 +1,29 @@
+from sparql_core.memory import MemoryManager
+
+
+def test_find_key_only_returns_keys_covering_every_word(tmp_path):
+    """A close spelling finds the stored key, a key that shares one word with it doesn't."""
+    memory = MemoryManager(str(tmp_path / "memory.json"))
+    try:
+        memory.save("favorite_color", "blue")
+        memory.save("home_city", "Lisbon")
+
+        assert memory.find_key("favorite_color") == "favorite_color"
+        assert memory.find_key("favourite color") == "favorite_color"
+        assert memory.find_key("favorite_food") is None
+        assert memory.find_key("work_city") is None
+    finally:
+        memory.close()
+
+
+def test_whole_memory_goes_in_the_prompt_while_it_fits(tmp_path):
+    """Standing facts are in the prompt even when they share no words with the question."""
+    memory = MemoryManager(str(tmp_path / "memory.json"))
+    try:
+        memory.save("name", "Ada")
+        memory.save("spelling", "British")
+
+        prompt = memory.get_relevant_memory_as_string("what time is it", max_tokens=300)
+        assert "- name: Ada" in prompt and "- spelling: British" in prompt
+    finally:
+        memory.close()
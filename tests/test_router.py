@@ -0,0 +1,48 @@
+import json
+from types import SimpleNamespace
+
+from sparql_core.core_brain import CoreBrain
+from sparql_core.memory import MemoryManager
+from sparql_core.router import IntentRouter
+
+NOW = "2026-10-17T21:34:00"
+
+
+def test_recall_is_not_routed_to_a_different_key(tmp_path):
+    """'What is my favorite food' must not be answered with favorite_color."""
+    memory = MemoryManager(str(tmp_path / "memory.json"))
+    try:
+        memory.save("favorite_color", "blue")
+        router = IntentRouter()
+
+        assert router.route("what is my favorite food", memory) is None
+        assert router.route("What is my favorite color?", memory).arguments == {"key": "favorite_color"}
+    finally:
+        memory.close()
+
+
+def test_remember_keeps_the_value_as_spoken():
+    """Case and symbols are kept; only the full stop speech recognition adds is dropped."""
+    router = IntentRouter()
+
+    route = router.route("Remember that my password is Tr0ub4dor&3!.")
+    assert route.arguments == {"key": "password", "value": "Tr0ub4dor&3!"}
+    assert route.phrase("Successfully saved") == "Okay, I'll remember that your password is Tr0ub4dor&3!"
+
+    route = router.route("remember that my home city is New York.")
+    assert route.arguments == {"key": "home_city", "value": "New York"}
+
+
+def _time_tool_call():
+    return SimpleNamespace(function=SimpleNamespace(name="get_current_time", arguments=json.dumps({})))
+
+
+def test_template_reply_only_for_the_routers_own_questions():
+    """A question that merely uses the time tool still needs the model to answer it."""
+    brain = CoreBrain()
+    history = [{"role": "tool", "content": NOW}]
+
+    assert brain._speakable_reply("what time is it?", [_time_tool_call()], history) == (
+        "It's 9:34 PM on Saturday, 17 October."
+    )
+    assert brain._speakable_reply("how many days until christmas", [_time_tool_call()], history) is None
@@ -0,0 +1,15 @@
+from sparql_core.tools import registry
+
+
+def _names(schemas):
+    return {schema["function"]["name"] for schema in schemas}
+
+
+def test_select_offers_every_tool_when_no_keywords_match():
+    assert _names(registry.select("is it going to rain in Porto")) == set(registry.tools)
+
+
+def test_select_narrows_to_matching_tools():
+    names = _names(registry.select("My wife's birthday is 5 May"))
+    assert "save_to_memory" in names
+    assert "get_current_time" not in names